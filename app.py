@@ -1,22 +1,39 @@
 import streamlit as st
-import json
-import os
+
+import perf
+from progress import ProgressIndex
+from questionbank import load_question_bank
+from responsestore import get_response_store
 
 # --- Config ---
 QUESTIONS_PER_PAGE = 10
-QUESTIONS_FILE = "questions.json"
+INTERACTION_MODE = "live"  # "live" (save on every click) or "batch" (one form per page, saved on Save/Submit)
+QUESTIONS_FILE = "questions.json"  # or a streamed questions.jsonl bank
 RESPONSES_DIR = "responses/responses_in_progress"
 SUBMITTED_DIR = "responses/responses_submitted"
-
-
-os.makedirs(RESPONSES_DIR, exist_ok=True)
-os.makedirs(SUBMITTED_DIR, exist_ok=True)
+RESPONSES_DB = "responses/responses.sqlite3"
+STORAGE_BACKEND = "journal"  # "journal" (append-only log + snapshots), "json" (full rewrite) or "sqlite"
+STORAGE_OPTIONS = {
+    "json": {"responses_dir": RESPONSES_DIR, "submitted_dir": SUBMITTED_DIR},
+    "journal": {"responses_dir": RESPONSES_DIR, "submitted_dir": SUBMITTED_DIR},
+    "sqlite": {"db_path": RESPONSES_DB},
+}
+PERF_ENABLED = False  # rerun timings; also switched on by ANNOTATION_PERF=1
+PERF_ADMINS = {"Maja"}  # annotators who see the timing panel
+PERF_METRICS_FILE = "responses/perf_metrics.prom"
+PERF_DUMP_SECONDS = 30
+
+if PERF_ENABLED:
+    perf.enable()
+perf_session = perf.session_recorder(st.session_state)
+
+store = get_response_store(STORAGE_BACKEND, **STORAGE_OPTIONS[STORAGE_BACKEND])
 
 # --- Load Questions ---
-with open(QUESTIONS_FILE, "r", encoding="utf-8") as f:
-    questions = json.load(f)
+with perf.phase("load_questions", perf_session):
+    questions = load_question_bank(QUESTIONS_FILE)
 
-total_pages = (len(questions) - 1) // QUESTIONS_PER_PAGE + 1
+total_pages = questions.total_pages(QUESTIONS_PER_PAGE)
 
 # --- Annotator Login ---
 st.title("Annotation Task")
@@ -40,9 +57,6 @@ Notes:
 - Submit one page at a time. 
 - After submitting a page, you cannot change your answers for that page and your answers are saved for next time you log in.
             
-**BUG**: for the last question on the page to change color after annotation you sometimes need to click another option of that question.
-Sorry for the inconvenience. 
-            
 !!!! You may return later to complete the rest !!!! 
 just use the same ID to continue where you left off.
 
@@ -62,24 +76,22 @@ if annotator_id not in ALLOWED_ANNOTATORS:
     st.info("Valid IDs are: " + ", ".join(sorted(ALLOWED_ANNOTATORS)))
     st.stop()
 
-response_file = os.path.join(RESPONSES_DIR, f"{annotator_id}.json")
+# --- Load Previous Responses (stored as answer codes, shown as labels) ---
+with perf.phase("load_responses", perf_session):
+    responses = questions.decode_responses(store.load(annotator_id))
 
-# --- Load Previous Responses ---
-if os.path.exists(response_file):
-    with open(response_file, "r", encoding="utf-8") as f:
-        responses = json.load(f)
-else:
-    responses = {}
+# --- Progress index (built once per session, updated as answers arrive) ---
+progress_key = f"progress_{annotator_id}"
+if progress_key not in st.session_state:
+    with perf.phase("build_progress", perf_session):
+        st.session_state[progress_key] = ProgressIndex.from_responses(
+            questions, QUESTIONS_PER_PAGE, responses
+        )
+progress = st.session_state[progress_key]
 
 # --- Determine first unanswered page ---
-def find_first_unanswered_page():
-    for idx, q in enumerate(questions):
-        if str(q["id"]) not in responses:
-            return idx // QUESTIONS_PER_PAGE + 1
-    return 1
-
 if "page" not in st.session_state:
-    st.session_state.page = find_first_unanswered_page()
+    st.session_state.page = progress.first_unanswered_page()
 
 # --- Page Navigation ---
 page = st.number_input(
@@ -91,74 +103,185 @@ page = st.number_input(
     key="page"
 )
 
-start_idx = (page - 1) * QUESTIONS_PER_PAGE
-end_idx = min(start_idx + QUESTIONS_PER_PAGE, len(questions))
-
 # --- Submission tracking ---
-submitted_file = os.path.join(SUBMITTED_DIR, f"{annotator_id}_pg{page}.json")
-page_submitted = os.path.exists(submitted_file)
-
-# --- Question Loop ---
-updated = False
-all_answered = True
-
-for q in questions[start_idx:end_idx]:
-    qid = str(q["id"])
-    saved_choice = responses.get(qid, None)
-    choices = q["choices"]
-
-    if saved_choice in choices:
-        display_choices = choices
-        default_index = choices.index(saved_choice)
-    else:
-        display_choices = ["⬜ Please select an answer"] + choices
-        default_index = 0
-
-    unanswered = saved_choice is None
-    all_answered &= not unanswered
-
-    with st.container():
-        if unanswered:
-            st.markdown(
-                f'<div style="background-color:#494949;padding:10px;border-radius:5px">'
-                f"{q['question']}</div>",
-                unsafe_allow_html=True
-            )
+with perf.phase("check_submitted", perf_session):
+    page_submitted = store.is_page_submitted(annotator_id, page)
+
+# --- Question Fragments ---
+# Each question is its own fragment: a radio click reruns only that question
+# (and redraws the progress bar), not the whole page. The answer is saved in
+# the radio's on_change callback, before the fragment redraws, so the
+# question's colour always reflects the click that was just made. The full
+# script only reruns on navigation, on submit, or when an answer completes
+# the page (to show the submit button).
+PLACEHOLDER = "⬜ Please select an answer"
+page_questions = questions.page(page, QUESTIONS_PER_PAGE)
+
+
+def save_answer(qid: str, key: str):
+    selected = st.session_state[key]
+    if page_submitted or selected == PLACEHOLDER or responses.get(qid) == selected:
+        return
+    responses[qid] = selected
+    with perf.phase("save_answer", perf_session):
+        store.set_answer(annotator_id, qid, questions.encode_answer(qid, selected))
+        st.session_state.answer_saved = True
+        if progress.mark_answered(qid) and progress.page_complete(page):
+            st.session_state.page_completed = True
+
+
+def show_progress(saved: bool = False):
+    with progress_slot.container():
+        if saved:
+            st.success("Progress saved automatically.")
+        st.progress(
+            progress.percent_done() / 100,
+            text=f"{progress.answered}/{progress.total} questions answered · "
+                 f"{progress.pages_complete}/{progress.total_pages} pages complete",
+        )
+
+
+@st.fragment
+def render_question(q):
+    with perf.phase("render_question", perf_session):
+        qid = str(q["id"])
+        key = f"{annotator_id}_q_{qid}"
+        saved_choice = responses.get(qid, None)
+        choices = list(q["choices"])
+
+        if saved_choice in choices:
+            display_choices = choices
+            default_index = choices.index(saved_choice)
         else:
-            st.markdown(q["question"], unsafe_allow_html=True)
+            display_choices = [PLACEHOLDER] + choices
+            default_index = 0
 
+        if saved_choice is None:
+            st.markdown(q["html_unanswered"], unsafe_allow_html=True)
+        else:
+            st.markdown(q["html_answered"], unsafe_allow_html=True)
 
-        selected = st.radio(
+        st.radio(
             f"Select an answer for Q{qid}",
             options=display_choices,
             index=default_index,
-            key=f"{annotator_id}_q_{qid}",
+            key=key,
+            on_change=save_answer,
+            args=(qid, key),
             disabled=page_submitted
         )
+        st.markdown("---")
+
+        if st.session_state.pop("page_completed", False):
+            st.rerun()
+        if st.session_state.pop("answer_saved", False):
+            show_progress(saved=True)
+
+
+def read_page_form(keys: dict):
+    """The page form's answers, and the ones that differ from the stored responses."""
+    page_data, changed = {}, {}
+    for qid, key in keys.items():
+        selected = st.session_state.get(key, PLACEHOLDER)
+        if selected == PLACEHOLDER:
+            continue
+        page_data[qid] = selected
+        if responses.get(qid) != selected:
+            changed[qid] = selected
+    return page_data, changed
+
+
+def remember_answers(changed: dict):
+    responses.update(changed)
+    for qid in changed:
+        progress.mark_answered(qid)
+
+if INTERACTION_MODE == "batch":
+    # --- Page Form ---
+    # Clicks stay in the browser until Save or Submit, which send the whole
+    # page in one rerun and one storage write.
+    with perf.phase("render_page", perf_session), st.form(f"page_form_{page}"):
+        keys = {}
+        for q in page_questions:
+            qid = str(q["id"])
+            keys[qid] = f"{annotator_id}_form_q_{qid}"
+            saved_choice = responses.get(qid, None)
+            choices = list(q["choices"])
+            display_choices = choices if saved_choice in choices else [PLACEHOLDER] + choices
+
+            if saved_choice is None:
+                st.markdown(q["html_unanswered"], unsafe_allow_html=True)
+            else:
+                st.markdown(q["html_answered"], unsafe_allow_html=True)
+            st.radio(
+                f"Select an answer for Q{qid}",
+                options=display_choices,
+                index=display_choices.index(saved_choice) if saved_choice in display_choices else 0,
+                key=keys[qid],
+                disabled=page_submitted
+            )
+            st.markdown("---")
+
+        save_clicked = st.form_submit_button("💾 Save Answers", disabled=page_submitted)
+        submit_clicked = st.form_submit_button("✅ Submit This Page", disabled=page_submitted)
+
+    if save_clicked or submit_clicked:
+        page_data, changed = read_page_form(keys)
+        if submit_clicked and len(page_data) == len(page_questions):
+            # Changed answers and the page lock go to the store in one call
+            with perf.phase("submit_page", perf_session):
+                store.submit_page(
+                    annotator_id, page, questions.encode_responses(page_data),
+                    answers=questions.encode_responses(changed),
+                )
+            remember_answers(changed)
+            st.success(f"Page {page} submitted and locked.")
+            st.rerun()
+        if changed:
+            with perf.phase("save_page", perf_session):
+                store.set_answers(annotator_id, questions.encode_responses(changed))
+            remember_answers(changed)
+        if submit_clicked:
+            st.warning("Please answer all questions on this page before submitting.")
+        else:
+            st.session_state.answer_saved = True
+            st.rerun()
 
-        if not page_submitted and selected != "⬜ Please select an answer":
-            if responses.get(qid) != selected:
-                responses[qid] = selected
-                updated = True
-
-    st.markdown("---")
-
-# --- Save Responses ---
-if updated:
-    with open(response_file, "w", encoding="utf-8") as f:
-        json.dump(responses, f, indent=2)
-    st.success("Progress saved automatically.")
-
-# --- Submit Page ---
-if all_answered and not page_submitted:
-    if st.button("✅ Submit This Page"):
-        page_data = {
-            str(q["id"]): responses[str(q["id"])]
-            for q in questions[start_idx:end_idx]
-        }
-        with open(submitted_file, "w", encoding="utf-8") as f:
-            json.dump(page_data, f, indent=2)
-        st.success(f"Page {page} submitted and locked.")
-        st.rerun()
-elif page_submitted:
-    st.info("✅ This page has been submitted and cannot be changed.")
+    progress_slot = st.empty()
+    show_progress(st.session_state.pop("answer_saved", False))
+    if page_submitted:
+        st.info("✅ This page has been submitted and cannot be changed.")
+
+else:
+    # Slots are laid out first so a question fragment can redraw the progress bar below it
+    question_slots = [st.container() for _ in page_questions]
+    progress_slot = st.empty()
+    saved = st.session_state.pop("answer_saved", False)
+
+    with perf.phase("render_page", perf_session):
+        for slot, q in zip(question_slots, page_questions):
+            with slot:
+                render_question(q)
+
+    all_answered = all(str(q["id"]) in responses for q in page_questions)
+    show_progress(saved)
+
+    # --- Submit Page ---
+    if all_answered and not page_submitted:
+        if st.button("✅ Submit This Page"):
+            page_data = {
+                str(q["id"]): responses[str(q["id"])]
+                for q in page_questions
+            }
+            with perf.phase("submit_page", perf_session):
+                store.submit_page(annotator_id, page, questions.encode_responses(page_data))
+            st.success(f"Page {page} submitted and locked.")
+            st.rerun()
+    elif page_submitted:
+        st.info("✅ This page has been submitted and cannot be changed.")
+
+# --- Timings ---
+if perf.is_enabled():
+    perf.PROCESS.maybe_dump(PERF_METRICS_FILE, PERF_DUMP_SECONDS)
+    if annotator_id in PERF_ADMINS:
+        perf.render_panel(perf_session)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# Crash-safe file writes and content hashes, shared by the apps and the
+# data-preparation scripts in userstudy/.
+#
+#     with AtomicFile("questions.json", suffix=".json") as f:
+#         json.dump(bank, f)
+#
+# Output goes to a temporary file in the target's directory and is renamed
+# over the target only once it is complete, so readers (and a crash part-way)
+# see either the old file or the new one, never a torn mix.
+
+
+def _fsync_dir(directory: str):
+    # Persist the rename itself; not supported on every platform.
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class AtomicFile:
+    """A temporary file that replaces `path` on commit() and vanishes on discard().
+
+    As a context manager it commits on a clean exit and discards on an
+    exception. With `durable` the data and the rename are fsync'd, for files
+    that must survive a power loss (responses), not just a crash of the
+    writer (caches, generated data).
+    """
+
+    def __init__(self, path: str, mode: str = "w", suffix: str = "", durable: bool = False):
+        self.path = path
+        self.durable = durable
+        self.directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(self.directory, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=suffix)
+        self.file = os.fdopen(fd, mode, encoding=None if "b" in mode else "utf-8")
+        # mkstemp creates 0600 files; keep the target's mode, or use the usual 0644
+        try:
+            os.chmod(self.tmp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        except OSError:
+            pass
+
+    def commit(self):
+        try:
+            if self.durable:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            self.file.close()
+            os.replace(self.tmp_path, self.path)
+        except BaseException:
+            self.discard()
+            raise
+        if self.durable:
+            _fsync_dir(self.directory)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self.file
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+        return False
+
+
+def atomic_write_json(path: str, data, indent=2, durable: bool = True, **dump_options):
+    """Write `data` to `path` so readers see either the old or the new file."""
+    with AtomicFile(path, suffix=".json", durable=durable) as f:
+        json.dump(data, f, indent=indent, **dump_options)
+
+
+def file_digest(path: str) -> str:
+    """SHA-1 of the file's content, read in 1 MiB blocks."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
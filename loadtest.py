@@ -0,0 +1,344 @@
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import Counter
+
+import perf
+
+# Headless load test for app.py and userstudy/app3.py.
+#
+# Each simulated annotator is one Streamlit session driven through the
+# testing API (AppTest) in its own process. It logs in, answers every
+# question on a page at a configurable rate, submits, moves on to the next
+# page, and so on. The processes share only the storage in the work
+# directory (response files, the SQLite database, or a SQLite-backed fake
+# Sheets file), like the server processes of a multi-worker deployment, so
+# their reruns, storage writes and think time genuinely overlap. The report
+# lists throughput, rerun latency percentiles, the app's own perf.py phase
+# timings and the storage / sheet calls made, summed over all processes.
+#
+#   python loadtest.py --app app --backend journal --annotators 8 --pages 2
+#   python loadtest.py --app app3 --backend fake --mode batch
+#   python loadtest.py --app app3 --sheet-latency 0.2 --sheet-quota 60
+#
+# AppTest reruns the whole script on every interaction (fragments included),
+# so latencies are upper bounds for the live mode of app.py. Process-wide
+# caches (question bank, stores, live-save queue) exist once per process
+# here rather than once per server. Each process also runs its own fake
+# Sheets simulator, so --sheet-quota applies per annotator. Wall time is
+# measured from the moment all processes have started up.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APPS = {
+    "app": os.path.join(ROOT, "app.py"),
+    "app3": os.path.join(ROOT, "userstudy", "app3.py"),
+}
+APP_BACKENDS = {
+    "app": ("json", "journal", "sqlite"),
+    "app3": ("fake",),
+}
+SUBMIT_LABEL = "Submit This Page"
+
+# Store and sheet methods whose calls are counted during a run
+STORE_METHODS = ("load", "set_answers", "is_page_submitted", "submit_page")
+SHEET_METHODS = ("read", "update")
+
+
+def set_config(source: str, name: str, value) -> str:
+    """Replace the `NAME = ...` config line of an app script."""
+    pattern = re.compile(rf"^{name} = .*$", re.MULTILINE)
+    if not pattern.search(source):
+        raise ValueError(f"{name} is not configured in this app")
+    return pattern.sub(lambda _: f"{name} = {value!r}", source, count=1)
+
+
+def build_script(app: str, backend: str, mode: str, workdir: str, questions_file: str,
+                 annotators: list, sheet_options: dict = None) -> str:
+    with open(APPS[app], "r", encoding="utf-8") as f:
+        source = f.read()
+    source = set_config(source, "QUESTIONS_FILE", questions_file)
+    source = set_config(source, "INTERACTION_MODE", mode)
+    source = set_config(source, "ALLOWED_ANNOTATORS", set(annotators))
+    if app == "app":
+        source = set_config(source, "STORAGE_BACKEND", backend)
+        source = set_config(source, "RESPONSES_DIR", os.path.join(workdir, "responses_in_progress"))
+        source = set_config(source, "SUBMITTED_DIR", os.path.join(workdir, "responses_submitted"))
+        source = set_config(source, "RESPONSES_DB", os.path.join(workdir, "responses.sqlite3"))
+        source = set_config(source, "PERF_METRICS_FILE", os.path.join(workdir, "perf_metrics.prom"))
+    else:
+        source = set_config(source, "SHEETS_BACKEND", backend)
+        source = set_config(source, "FAKE_SHEETS_OPTIONS", sheet_options or {})
+        source = set_config(source, "PERF_METRICS_FILE", os.path.join(workdir, "perf_metrics.prom"))
+    return source
+
+
+# --- Call counting ---
+class CallCounter:
+    """Counts calls to selected methods of some classes while active."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._patched = []
+
+    def watch(self, cls, methods, prefix: str):
+        for name in methods:
+            original = cls.__dict__.get(name)
+            if original is None:
+                continue
+            self._patched.append((cls, name, original))
+            setattr(cls, name, self._wrap(original, f"{prefix}.{name}"))
+
+    def _wrap(self, fn, label: str):
+        def counted(*args, **kwargs):
+            with self._lock:
+                self.counts[label] += 1
+            return fn(*args, **kwargs)
+        return counted
+
+    def restore(self):
+        for cls, name, original in reversed(self._patched):
+            setattr(cls, name, original)
+        self._patched.clear()
+
+
+def watch_backends(counter: CallCounter):
+    sys.path.insert(0, os.path.join(ROOT, "userstudy"))
+    import fakesheets
+    import responsestore
+
+    for cls in (responsestore.JsonFileStore, responsestore.JournalStore,
+                responsestore.FileResponseStore, responsestore.SqliteStore):
+        counter.watch(cls, STORE_METHODS, "store")
+    counter.watch(fakesheets.FakeGSheetsConnection, SHEET_METHODS, "sheets")
+
+
+# --- Simulated annotator ---
+def find_button(at, label: str):
+    return next((b for b in at.button if label in b.label), None)
+
+
+def simulate_annotator(script_path: str, annotator_id: str, pages: int, think_time: float,
+                       mode: str, latencies: perf.PerfRecorder, timeout: float) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    def timed(step: str, action):
+        start = time.perf_counter()
+        at_ = action()
+        latencies.record(step, time.perf_counter() - start)
+        if at_.exception:
+            raise RuntimeError(f"{annotator_id}: {at_.exception[0].message}")
+        return at_
+
+    at = AppTest.from_file(script_path, default_timeout=timeout)
+    timed("open", at.run)
+    at.text_input[0].input(annotator_id)
+    timed("login", at.run)
+
+    answered = submitted = 0
+    for _ in range(pages):
+        start_page = at.number_input[0].value
+        for i in range(len(at.radio)):
+            radio = at.radio[i]
+            if radio.disabled:
+                continue
+            radio.set_value(radio.options[-1])
+            answered += 1
+            if mode == "live":
+                timed("answer", at.run)
+            if think_time:
+                time.sleep(think_time)
+
+        submit = find_button(at, SUBMIT_LABEL)
+        if submit is not None and not submit.disabled:
+            submit.click()
+            timed("submit", at.run)
+            submitted += 1
+
+        page_input = at.number_input[0]
+        if start_page >= page_input.max:
+            break
+        page_input.set_value(start_page + 1)
+        timed("navigate", at.run)
+
+    return {"annotator": annotator_id, "answered": answered, "submitted": submitted}
+
+
+def run_annotator(config: dict, start_barrier, results):
+    """Process entry point: simulate one annotator and send back its measurements."""
+    try:
+        sys.path.insert(0, ROOT)
+        perf.enable()
+        latencies = perf.PerfRecorder()
+        counter = CallCounter()
+        watch_backends(counter)
+        from streamlit.testing.v1 import AppTest  # noqa: F401  (import before the clock starts)
+    except BaseException:
+        start_barrier.abort()
+        results.put({"error": traceback.format_exc()})
+        return
+
+    try:
+        start_barrier.wait()
+        start = time.time()
+        result = simulate_annotator(config["script_path"], config["annotator_id"], config["pages"],
+                                    config["think_time"], config["mode"], latencies, config["timeout"])
+        result.update(
+            start=start,
+            end=time.time(),
+            latencies=latencies.export(),
+            phases=perf.PROCESS.export(),
+            calls=dict(counter.counts),
+        )
+        if config["sheet_options"] is not None:
+            import fakesheets
+            result["sheets"] = fakesheets.get_fake_backend(**config["sheet_options"]).stats()
+        results.put(result)
+    except BaseException:
+        results.put({"error": traceback.format_exc()})
+
+
+def prepare_storage(app: str, backend: str, workdir: str, sheet_options: dict):
+    """Create the shared SQLite files up front, so the annotator processes do
+    not race to switch a new file to WAL and create its tables."""
+    sys.path.insert(0, os.path.join(ROOT, "userstudy"))
+    if app == "app" and backend == "sqlite":
+        import responsestore
+        responsestore.SqliteConnectionPool(os.path.join(workdir, "responses.sqlite3")).close()
+    elif sheet_options is not None:
+        import fakesheets
+        fakesheets.SqliteSheetStore(sheet_options["db_path"])
+
+
+def run_annotators(configs: list) -> list:
+    # spawn, not fork: every annotator gets a fresh interpreter, as a new
+    # server worker would
+    context = multiprocessing.get_context("spawn")
+    start_barrier = context.Barrier(len(configs))
+    results = context.Queue()
+    processes = [context.Process(target=run_annotator, args=(config, start_barrier, results))
+                 for config in configs]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    errors = [r["error"] for r in collected if "error" in r]
+    if errors:
+        raise RuntimeError("Simulated annotator failed:\n" + errors[0])
+    return sorted(collected, key=lambda r: r["annotator"])
+
+
+def merge_sheet_stats(results: list):
+    stats = [r["sheets"] for r in results if "sheets" in r]
+    if not stats:
+        return None
+    calls, errors = Counter(), Counter()
+    for s in stats:
+        calls.update(s["calls"])
+        errors.update(s["errors"])
+    return {
+        "calls": dict(calls),
+        "errors": dict(errors),
+        "simulated_seconds": sum(s["simulated_seconds"] for s in stats),
+    }
+
+
+# --- Report ---
+def print_report(app, backend, mode, n_annotators, wall, results, latencies, calls, sheets=None):
+    answered = sum(r["answered"] for r in results)
+    submitted = sum(r["submitted"] for r in results)
+    reruns = sum(stats["count"] for stats in latencies.summary().values())
+
+    print(f"\n🚦 Load test: {app} · backend={backend} · mode={mode} · {n_annotators} annotators")
+    print(f"⏱️ Wall time {wall:.2f}s · {reruns} reruns ({reruns / wall:.1f}/s) · "
+          f"{answered} answers ({answered / wall:.1f}/s) · {submitted} pages submitted")
+
+    def table(title, summary):
+        print(f"\n{title}")
+        print(f"{'step':<18} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, stats in summary.items():
+            print(f"{name:<18} {stats['count']:>6} {stats['p50'] * 1000:>9.1f} "
+                  f"{stats['p95'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f}")
+
+    table("📈 Rerun latency (AppTest round trip)", latencies.summary())
+    table("🔬 App phases (perf.py)", perf.PROCESS.summary())
+
+    print("\n💾 Storage / sheet calls")
+    for name, count in sorted(calls.items()):
+        per_answer = f"{count / answered:.2f}/answer" if answered else ""
+        print(f"{name:<28} {count:>7} {per_answer:>14}")
+
+    if sheets is not None:
+        stats = sheets
+        print(f"\n📡 Fake Sheets API · {sum(stats['calls'].values())} requests · "
+              f"{stats['simulated_seconds']:.2f}s simulated latency · errors {stats['errors'] or 'none'}")
+        for name, count in sorted(stats["calls"].items()):
+            print(f"{name:<28} {count:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent annotators against an app.")
+    parser.add_argument("--app", choices=sorted(APPS), default="app")
+    parser.add_argument("--backend", default=None,
+                        help="app: json, journal or sqlite; app3: fake (default: first of these)")
+    parser.add_argument("--mode", choices=("live", "batch"), default="live")
+    parser.add_argument("--annotators", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=2, help="pages each annotator answers")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between answers")
+    parser.add_argument("--questions", default=os.path.join(ROOT, "questions.json"))
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds per rerun")
+    parser.add_argument("--workdir", default=None, help="response files go here (default: a temp dir)")
+    parser.add_argument("--sheet-latency", type=float, default=0.0,
+                        help="app3: seconds added to every fake Sheets request")
+    parser.add_argument("--sheet-quota", type=int, default=None,
+                        help="app3: fake Sheets requests per minute before 429 errors")
+    args = parser.parse_args()
+
+    backend = args.backend or APP_BACKENDS[args.app][0]
+    if backend not in APP_BACKENDS[args.app]:
+        parser.error(f"--backend for {args.app} must be one of {APP_BACKENDS[args.app]}")
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="loadtest-"))
+    os.makedirs(workdir, exist_ok=True)
+    annotators = [f"sim{i:03d}" for i in range(args.annotators)]
+    script_path = os.path.join(workdir, f"loadtest_{args.app}.py")
+    # The annotator processes share the fake Sheets through a SQLite file
+    sheet_options = None
+    if backend == "fake":
+        sheet_options = {"latency": args.sheet_latency, "quota_per_minute": args.sheet_quota,
+                         "db_path": os.path.join(workdir, "fake_sheets.sqlite3")}
+    with open(script_path, "w", encoding="utf-8") as f:
+        f.write(build_script(args.app, backend, args.mode, workdir,
+                             os.path.abspath(args.questions), annotators, sheet_options))
+
+    prepare_storage(args.app, backend, workdir, sheet_options)
+    results = run_annotators([
+        {"script_path": script_path, "annotator_id": aid, "pages": args.pages,
+         "think_time": args.think_time, "mode": args.mode, "timeout": args.timeout,
+         "sheet_options": sheet_options}
+        for aid in annotators
+    ])
+    wall = max(r["end"] for r in results) - min(r["start"] for r in results)
+
+    latencies = perf.PerfRecorder()
+    perf.PROCESS.reset()
+    calls = Counter()
+    for r in results:
+        latencies.merge(r["latencies"])
+        perf.PROCESS.merge(r["phases"])
+        calls.update(r["calls"])
+    print_report(args.app, backend, args.mode, args.annotators, wall, results, latencies, calls,
+                 merge_sheet_stats(results))
+    print(f"\n📁 Responses written to {workdir}")
+
+
+if __name__ == "__main__":
+    main()
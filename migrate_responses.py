@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import re
+from datetime import datetime
+
+from responsestore import JournalStore, SqliteStore
+
+# Import the JSON response tree (responses_in_progress/ + responses_submitted/)
+# into the SQLite backend. Safe to re-run: rows are upserted. The source tree
+# is only read, never repaired or compacted.
+#
+#   python migrate_responses.py --db responses/responses.sqlite3
+
+SUBMITTED_NAME = re.compile(r"^(?P<annotator>.+)_pg(?P<page>\d+)\.json$")
+
+
+def migrate(responses_dir: str, submitted_dir: str, db_path: str) -> dict:
+    # JournalStore reads both plain <id>.json snapshots and pending journals
+    source = JournalStore(responses_dir, submitted_dir)
+    target = SqliteStore(db_path)
+    counts = {"annotators": 0, "answers": 0, "pages": 0}
+
+    annotators = sorted({
+        name.rsplit(".", 1)[0]
+        for name in os.listdir(responses_dir)
+        if name.endswith((".json", ".journal")) and not name.startswith(".tmp-")
+    })
+    for annotator_id in annotators:
+        responses = source.load_readonly(annotator_id)
+        target.set_answers(annotator_id, responses)
+        counts["annotators"] += 1
+        counts["answers"] += len(responses)
+
+    for name in sorted(os.listdir(submitted_dir)):
+        match = SUBMITTED_NAME.match(name)
+        if not match:
+            continue
+        path = os.path.join(submitted_dir, name)
+        with open(path, "r", encoding="utf-8") as f:
+            page_data = json.load(f)
+        submitted_at = datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat()
+        target.import_submission(match["annotator"], int(match["page"]), page_data, submitted_at)
+        counts["pages"] += 1
+
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import JSON annotation responses into SQLite.")
+    parser.add_argument("--responses-dir", default="responses/responses_in_progress")
+    parser.add_argument("--submitted-dir", default="responses/responses_submitted")
+    parser.add_argument("--db", default="responses/responses.sqlite3")
+    args = parser.parse_args()
+
+    counts = migrate(args.responses_dir, args.submitted_dir, args.db)
+    print(
+        f"✅ Imported {counts['answers']} answers from {counts['annotators']} annotators "
+        f"and {counts['pages']} submitted pages into {args.db}"
+    )
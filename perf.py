@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+from fileio import AtomicFile
+
+# Lightweight rerun timing for the annotation apps.
+#
+#     with perf.phase("load_responses", perf_session):
+#         responses = store.load(annotator_id)
+#
+# Each phase is recorded in a process-wide recorder (all sessions) and,
+# optionally, in a per-session recorder kept in st.session_state. A recorder
+# keeps a count, a running sum and a window of recent samples per phase, from
+# which p50/p95/p99 are computed on demand. When timing is disabled, phase()
+# returns one shared no-op context manager, so instrumented code pays only
+# for a function call and a flag check.
+
+PERF_ENV = "ANNOTATION_PERF"  # set to 1 to enable timing without a code change
+WINDOW = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_NAME = "annotation_phase_seconds"
+
+_enabled = os.environ.get(PERF_ENV, "") not in ("", "0")
+_NOOP = nullcontext()
+
+
+def enable(flag: bool = True):
+    global _enabled
+    _enabled = flag
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class Histogram:
+    """Count and sum of all samples plus a bounded window for percentiles."""
+
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self, window: int = WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def merge(self, samples, count: int, total: float):
+        self.samples.extend(samples)
+        self.count += count
+        self.total += total
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+        n = len(ordered)
+        result = {"count": self.count, "sum": self.total}
+        for q in QUANTILES:
+            result[f"p{round(q * 100)}"] = ordered[min(n - 1, int(q * n))] if n else 0.0
+        return result
+
+
+class PerfRecorder:
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._last_dump = 0.0
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.window)
+            histogram.add(seconds)
+
+    def summary(self) -> dict:
+        """{phase: {"count", "sum", "p50", "p95", "p99"}}, in seconds."""
+        with self._lock:
+            return {name: h.summary() for name, h in sorted(self._histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def export(self) -> dict:
+        """{phase: (recent samples, count, sum)}; plain data, so it can cross processes."""
+        with self._lock:
+            return {name: (list(h.samples), h.count, h.total) for name, h in self._histograms.items()}
+
+    def merge(self, exported: dict):
+        """Add another recorder's export() to this one."""
+        with self._lock:
+            for name, (samples, count, total) in exported.items():
+                histogram = self._histograms.get(name)
+                if histogram is None:
+                    histogram = self._histograms[name] = Histogram(self.window)
+                histogram.merge(samples, count, total)
+
+    def to_prometheus(self, metric: str = METRIC_NAME) -> str:
+        lines = [
+            f"# HELP {metric} Time spent per phase of an app rerun.",
+            f"# TYPE {metric} summary",
+        ]
+        for name, stats in self.summary().items():
+            for q in QUANTILES:
+                value = stats[f"p{round(q * 100)}"]
+                lines.append(f'{metric}{{phase="{name}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'{metric}_sum{{phase="{name}"}} {stats["sum"]:.6f}')
+            lines.append(f'{metric}_count{{phase="{name}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump_prometheus(self, path: str):
+        """Write the Prometheus text format to `path`, replacing it atomically."""
+        with AtomicFile(path, suffix=".prom") as f:
+            f.write(self.to_prometheus())
+
+    def maybe_dump(self, path: str, interval: float = 30.0):
+        """Dump at most once per `interval` seconds; a no-op while timing is disabled."""
+        if not _enabled or not path:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_dump < interval:
+                return
+            self._last_dump = now
+        self.dump_prometheus(path)
+
+
+PROCESS = PerfRecorder()
+
+
+class _Phase:
+    __slots__ = ("name", "session", "start")
+
+    def __init__(self, name: str, session):
+        self.name = name
+        self.session = session
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Also recorded when the block ends in st.rerun() / st.stop()
+        elapsed = time.perf_counter() - self.start
+        PROCESS.record(self.name, elapsed)
+        if self.session is not None:
+            self.session.record(self.name, elapsed)
+        return False
+
+
+def phase(name: str, session: PerfRecorder = None):
+    """Time the enclosed block as `name`."""
+    if not _enabled:
+        return _NOOP
+    return _Phase(name, session)
+
+
+def session_recorder(session_state, key: str = "perf_recorder"):
+    """This session's recorder, or None while timing is disabled."""
+    if not _enabled:
+        return None
+    recorder = session_state.get(key)
+    if recorder is None:
+        recorder = session_state[key] = PerfRecorder(window=256)
+    return recorder
+
+
+def render_panel(session: PerfRecorder = None, counters: dict = None):
+    """Admin panel with this session's and the process-wide timings (milliseconds).
+
+    `counters` ({title: {name: value}}) adds tables such as cache hit counts.
+    """
+    import streamlit as st
+
+    def rows(recorder):
+        return [
+            {"phase": name, "count": stats["count"],
+             **{k: round(stats[k] * 1000, 2) for k in ("p50", "p95", "p99")},
+             "total": round(stats["sum"] * 1000, 1)}
+            for name, stats in recorder.summary().items()
+        ]
+
+    with st.expander("⏱️ Rerun timings (ms)"):
+        if session is not None:
+            st.markdown("**This session**")
+            st.table(rows(session))
+        st.markdown("**All sessions**")
+        st.table(rows(PROCESS))
+        for title, values in (counters or {}).items():
+            st.markdown(f"**{title}**")
+            st.table([{"counter": name, "value": value} for name, value in values.items()])
+        st.download_button("Prometheus metrics", PROCESS.to_prometheus(), file_name="perf_metrics.prom")
@@ -0,0 +1,75 @@
+from array import array
+
+# Incremental progress index for one annotator.
+#
+# Answers are tracked in a bitmap over question positions together with an
+# answered count per page. Answers are only ever added, so the first
+# incomplete page can only move forward. A cursor that skips completed pages
+# answers "first unanswered page" in amortized O(1), and "pages complete" and
+# "% done" are plain counters.
+#
+# The index lives in st.session_state: it is built once per session from the
+# loaded responses and then updated as answers arrive. Question positions
+# come from the (process-wide) bank, so a session only adds one bit per
+# question and one counter per page.
+
+
+class ProgressIndex:
+    def __init__(self, bank, per_page: int):
+        self.bank = bank
+        self.per_page = per_page
+        self.total = len(bank)
+        self.total_pages = max(1, (self.total - 1) // per_page + 1)
+        self._bitmap = bytearray((self.total + 7) // 8)
+        self._page_counts = array("I", bytes(4 * self.total_pages))
+        self.answered = 0
+        self.pages_complete = 0
+        self._cursor = 0
+
+    @classmethod
+    def from_responses(cls, bank, per_page: int, responses: dict):
+        index = cls(bank, per_page)
+        for qid in responses:
+            index.mark_answered(qid)
+        return index
+
+    def _page_size(self, page_idx: int) -> int:
+        return min(self.per_page, self.total - page_idx * self.per_page)
+
+    def is_answered(self, qid) -> bool:
+        pos = self.bank.position(qid)
+        return pos is not None and bool(self._bitmap[pos >> 3] & (1 << (pos & 7)))
+
+    def mark_answered(self, qid) -> bool:
+        """Record an answer; returns True if the question was new."""
+        pos = self.bank.position(qid)
+        if pos is None:
+            return False
+        byte, bit = pos >> 3, 1 << (pos & 7)
+        if self._bitmap[byte] & bit:
+            return False
+        self._bitmap[byte] |= bit
+        self.answered += 1
+        page_idx = pos // self.per_page
+        self._page_counts[page_idx] += 1
+        if self._page_counts[page_idx] == self._page_size(page_idx):
+            self.pages_complete += 1
+        return True
+
+    def page_answered(self, page: int) -> int:
+        return self._page_counts[page - 1]
+
+    def page_complete(self, page: int) -> bool:
+        return self._page_counts[page - 1] == self._page_size(page - 1)
+
+    def first_unanswered_page(self) -> int:
+        """First page with an unanswered question, or 1 when everything is done."""
+        while self._cursor < self.total_pages and \
+                self._page_counts[self._cursor] == self._page_size(self._cursor):
+            self._cursor += 1
+        if self._cursor == self.total_pages:
+            return 1
+        return self._cursor + 1
+
+    def percent_done(self) -> float:
+        return 100.0 * self.answered / self.total if self.total else 100.0
@@ -0,0 +1,544 @@
+import hashlib
+import html
+import json
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+
+from fileio import AtomicFile, file_digest
+
+# Process-wide question bank cache shared by every Streamlit session.
+# Streamlit re-executes the app script on each interaction, but imported
+# modules stay loaded, so the parsed bank survives reruns and sessions.
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+# JSON Lines banks are opened lazily: pages kept in memory per bank, and the
+# page size used when iterating over a whole lazy bank.
+PAGE_CACHE_SIZE = 5
+PAGE_CACHE_ITER_SIZE = 100
+
+# --- Compiled bank format ---
+# {
+#   "format": "question-bank", "version": 2,
+#   "choice_sets": {"set0": [...choices...]},
+#   "variants": {"answered": "{html}", "unanswered": "<div ...>{html}</div>"},
+#   "questions": [{"id": 1, "html": "<sanitized question>", "choice_set": "set0"}]
+# }
+# The legacy format (a plain list of {"id", "question", "choices"}) is still
+# accepted and compiled in memory when loaded.
+#
+# --- Streaming bank format (JSON Lines, *.jsonl) ---
+# {"format": "question-bank-jsonl", "version": 2, "variants": {...}}
+# {"choice_set": "set0", "choices": [...]}      (written before its first use)
+# {"id": 1, "html": "<sanitized question>", "choice_set": "set0"}
+# One record per line, so banks can be written and read without holding the
+# whole file in memory.
+BANK_FORMAT = "question-bank"
+JSONL_FORMAT = "question-bank-jsonl"
+BANK_VERSION = 2
+DEFAULT_VARIANTS = {
+    "answered": "{html}",
+    "unanswered": '<div style="background-color:#494949;padding:10px;border-radius:5px">{html}</div>',
+}
+
+ALLOWED_TAGS = {"br", "span", "div", "strong", "b", "em", "i", "p"}
+VOID_TAGS = {"br"}
+DROP_CONTENT_TAGS = {"script", "style"}
+SAFE_STYLE = re.compile(r"^[#%(),.:;\w\s-]*$")
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self._dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping += 1
+        if tag not in ALLOWED_TAGS:
+            return
+        style = next((value for name, value in attrs if name == "style"), None)
+        if style and SAFE_STYLE.match(style) and "url(" not in style.lower() \
+                and "expression" not in style.lower():
+            self.out.append(f"<{tag} style='{html.escape(style, quote=True)}'>")
+        else:
+            self.out.append(f"<{tag}>")
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS and self._dropping:
+            self._dropping -= 1
+        if tag in ALLOWED_TAGS and tag not in VOID_TAGS:
+            self.out.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if not self._dropping:
+            self.out.append(html.escape(data, quote=False))
+
+
+def sanitize_html(text: str) -> str:
+    """Keep only simple formatting tags and inline styles from question text."""
+    parser = _Sanitizer()
+    parser.feed(text)
+    parser.close()
+    return "".join(parser.out)
+
+
+def render_variants(question_html: str, variants: dict) -> dict:
+    return {name: template.replace("{html}", question_html) for name, template in variants.items()}
+
+
+class _ChoiceSets:
+    """Interns choice lists into shared, named choice sets (set0, set1, ...)."""
+
+    def __init__(self):
+        self.choice_sets = {}
+        self._names = {}
+
+    def intern(self, choices) -> tuple:
+        """Return (name, is_new) for `choices`."""
+        choices = tuple(choices)
+        name = self._names.get(choices)
+        if name is not None:
+            return name, False
+        name = self._names[choices] = f"set{len(self._names)}"
+        self.choice_sets[name] = list(choices)
+        return name, True
+
+
+def compile_question_bank(questions, variants: dict = None) -> dict:
+    """Turn a list of {"id", "question", "choices"} dicts into the compiled format."""
+    choice_sets = _ChoiceSets()
+    compiled = []
+    for q in questions:
+        name, _ = choice_sets.intern(q["choices"])
+        compiled.append({"id": q["id"], "html": sanitize_html(q["question"]), "choice_set": name})
+    return {
+        "format": BANK_FORMAT,
+        "version": BANK_VERSION,
+        "choice_sets": choice_sets.choice_sets,
+        "variants": dict(variants or DEFAULT_VARIANTS),
+        "questions": compiled,
+    }
+
+
+class QuestionBankWriter:
+    """Writes a compiled bank one question at a time.
+
+    Output goes to a temporary file next to `path` and is renamed into place
+    on close, so a crash part-way leaves any previous bank untouched. Paths
+    ending in .jsonl get the JSON Lines format, anything else the JSON format
+    (with "questions" streamed before "choice_sets").
+    """
+
+    def __init__(self, path: str, variants: dict = None, jsonl: bool = None):
+        self.path = path
+        self.jsonl = path.endswith(".jsonl") if jsonl is None else jsonl
+        self.variants = dict(variants or DEFAULT_VARIANTS)
+        self.count = 0
+        self._choice_sets = _ChoiceSets()
+        self._out = AtomicFile(path, durable=True)
+        self._f = self._out.file
+        if self.jsonl:
+            self._write_line({"format": JSONL_FORMAT, "version": BANK_VERSION, "variants": self.variants})
+        else:
+            self._f.write(
+                f'{{"format": {json.dumps(BANK_FORMAT)}, "version": {BANK_VERSION}, '
+                f'"variants": {json.dumps(self.variants, ensure_ascii=False)}, "questions": [\n'
+            )
+
+    def _write_line(self, record: dict):
+        self._f.write(json.dumps(record, ensure_ascii=False))
+        self._f.write("\n")
+
+    def add(self, question: dict):
+        """Append one {"id", "question", "choices"} question."""
+        name, is_new = self._choice_sets.intern(question["choices"])
+        record = {"id": question["id"], "html": sanitize_html(question["question"]), "choice_set": name}
+        if self.jsonl:
+            if is_new:
+                self._write_line({"choice_set": name, "choices": list(question["choices"])})
+            self._write_line(record)
+        else:
+            if self.count:
+                self._f.write(",\n")
+            self._f.write("  " + json.dumps(record, ensure_ascii=False))
+        self.count += 1
+
+    def close(self):
+        if not self.jsonl:
+            choice_sets = json.dumps(self._choice_sets.choice_sets, ensure_ascii=False)
+            try:
+                self._f.write(f'\n], "choice_sets": {choice_sets}}}\n')
+            except BaseException:
+                self.abort()
+                raise
+        self._out.commit()
+
+    def abort(self):
+        self._out.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def _read_jsonl(lines) -> dict:
+    """Rebuild the compiled-bank dict from JSON Lines, one record at a time."""
+    data = {"format": BANK_FORMAT, "version": BANK_VERSION, "choice_sets": {},
+            "variants": dict(DEFAULT_VARIANTS), "questions": []}
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if "id" in record:
+            data["questions"].append(record)
+        elif "choices" in record:
+            data["choice_sets"][record["choice_set"]] = record["choices"]
+        elif record.get("format") == JSONL_FORMAT:
+            data["variants"] = dict(record.get("variants", DEFAULT_VARIANTS))
+        else:
+            raise ValueError("Not a question bank file")
+    return data
+
+
+def _as_compiled(data) -> dict:
+    if isinstance(data, list):
+        return compile_question_bank(data)
+    if data.get("format") != BANK_FORMAT:
+        raise ValueError("Not a question bank file")
+    return data
+
+
+class Question(Mapping):
+    """One compact question record, expanded lazily on first access.
+
+    Reads like the legacy question dict ("id", "question", "choices") plus
+    "choice_set", "html_answered" and "html_unanswered". Choices are the
+    bank's shared tuple, and the HTML variants are rendered once per process
+    the first time the question is shown.
+    """
+
+    __slots__ = ("_record", "_bank", "_rendered")
+    _KEYS = ("id", "question", "choice_set", "choices", "html_answered", "html_unanswered")
+
+    def __init__(self, record: dict, bank: "QuestionBank"):
+        self._record = record
+        self._bank = bank
+        self._rendered = None
+
+    def __getitem__(self, key):
+        if key == "id":
+            return self._record["id"]
+        if key == "question":
+            return self._record["html"]
+        if key == "choice_set":
+            return self._record["choice_set"]
+        if key == "choices":
+            return self._bank.choice_sets[self._record["choice_set"]]
+        if key in ("html_answered", "html_unanswered"):
+            if self._rendered is None:
+                self._rendered = render_variants(self._record["html"], self._bank.variants)
+            return self._rendered[key[len("html_"):]]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+
+class _AnswerCodes(ABC):
+    """Answer encoding shared by the eager and the lazy bank.
+
+    Responses are stored as the index of the chosen label in the question's
+    choice set. Older response files and sheets hold the full label text,
+    and decoding accepts both.
+    """
+
+    @abstractmethod
+    def choices_for(self, qid):
+        """The question's choice labels, or None for an unknown question."""
+
+    def total_pages(self, per_page: int) -> int:
+        return (len(self) - 1) // per_page + 1
+
+    def encode_answer(self, qid, label: str):
+        choices = self.choices_for(qid)
+        if choices is None or label not in choices:
+            return label
+        return choices.index(label)
+
+    def decode_answer(self, qid, value):
+        choices = self.choices_for(qid)
+        if choices is None:
+            return value
+        if value in choices:
+            return value
+        try:
+            code = int(value)
+        except (TypeError, ValueError):
+            return None
+        return choices[code] if 0 <= code < len(choices) else None
+
+    def decode_responses(self, responses: dict) -> dict:
+        decoded = {}
+        for qid, value in responses.items():
+            label = self.decode_answer(qid, value)
+            if label is not None:
+                decoded[str(qid)] = label
+        return decoded
+
+    def encode_responses(self, responses: dict) -> dict:
+        return {qid: self.encode_answer(qid, label) for qid, label in responses.items()}
+
+
+class QuestionBank(_AnswerCodes):
+    """Read-only, indexed view over a parsed question file."""
+
+    def __init__(self, data, fingerprint: str):
+        data = _as_compiled(data)
+        self.fingerprint = fingerprint
+        self.choice_sets = {name: tuple(choices) for name, choices in data["choice_sets"].items()}
+        self.variants = dict(data.get("variants", DEFAULT_VARIANTS))
+        self.questions = tuple(Question(record, self) for record in data["questions"])
+        self._position = {str(q["id"]): i for i, q in enumerate(self.questions)}
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def __iter__(self):
+        return iter(self.questions)
+
+    def get(self, qid):
+        pos = self._position.get(str(qid))
+        return None if pos is None else self.questions[pos]
+
+    def position(self, qid):
+        """Index of `qid` in bank order, or None."""
+        return self._position.get(str(qid))
+
+    def ids(self) -> list:
+        return list(self._position)
+
+    def choices_for(self, qid):
+        q = self.get(qid)
+        return None if q is None else q["choices"]
+
+    def page(self, page: int, per_page: int) -> tuple:
+        start_idx = (page - 1) * per_page
+        return self.questions[start_idx:start_idx + per_page]
+
+
+class LazyQuestionBank(_AnswerCodes):
+    """Page-windowed view over a JSON Lines bank.
+
+    Opening the bank scans the file once and keeps only an offset index: the
+    byte offset, id and choice set of every question. page() reads just the
+    lines of that page in a single seek + read. The last few pages are kept
+    in an LRU and the neighbours of the page just shown are prefetched in the
+    background, so next/previous navigation is served from memory. Memory
+    stays bounded by the cache size, whatever the size of the bank.
+    """
+
+    def __init__(self, path: str, fingerprint: str, cache_pages: int = PAGE_CACHE_SIZE,
+                 prefetch: bool = True):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.cache_pages = cache_pages
+        self.prefetch = prefetch
+        self.choice_sets = {}
+        self.variants = dict(DEFAULT_VARIANTS)
+        self.reads = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._scan()
+
+    def _scan(self):
+        offsets, ids, set_codes = [], [], []
+        set_names = []
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if "id" in record:
+                        offsets.append(offset)
+                        ids.append(str(record["id"]))
+                        set_codes.append(set_names.index(record["choice_set"]))
+                    elif "choices" in record:
+                        set_names.append(record["choice_set"])
+                        self.choice_sets[record["choice_set"]] = tuple(record["choices"])
+                    elif record.get("format") == JSONL_FORMAT:
+                        self.variants = dict(record.get("variants", DEFAULT_VARIANTS))
+                    else:
+                        raise ValueError("Not a question bank file")
+                offset += len(line)
+        self._end = offset
+        self._offsets = array("q", offsets)
+        self._set_codes = array("H", set_codes)
+        self._set_names = set_names
+        self._ids = ids
+        self._position = {qid: i for i, qid in enumerate(ids)}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self):
+        for page in range(1, self.total_pages(PAGE_CACHE_ITER_SIZE) + 1):
+            yield from self._read_page(page, PAGE_CACHE_ITER_SIZE)
+
+    def ids(self) -> list:
+        return list(self._ids)
+
+    def position(self, qid):
+        return self._position.get(str(qid))
+
+    def choices_for(self, qid):
+        pos = self._position.get(str(qid))
+        if pos is None:
+            return None
+        return self.choice_sets[self._set_names[self._set_codes[pos]]]
+
+    def get(self, qid):
+        pos = self._position.get(str(qid))
+        if pos is None:
+            return None
+        return self._read_range(pos, pos + 1)[0]
+
+    def _read_range(self, start: int, stop: int) -> tuple:
+        start_offset = self._offsets[start]
+        stop_offset = self._offsets[stop] if stop < len(self._offsets) else self._end
+        with open(self.path, "rb") as f:
+            f.seek(start_offset)
+            block = f.read(stop_offset - start_offset)
+        self.reads += 1
+        questions = []
+        for line in block.splitlines():
+            if line.strip():
+                record = json.loads(line)
+                if "id" in record:
+                    questions.append(Question(record, self))
+        return tuple(questions)
+
+    def _read_page(self, page: int, per_page: int) -> tuple:
+        start = (page - 1) * per_page
+        stop = min(start + per_page, len(self._ids))
+        if start >= stop or start < 0:
+            return ()
+        return self._read_range(start, stop)
+
+    def _cached_page(self, page: int, per_page: int) -> tuple:
+        key = (page, per_page)
+        with self._lock:
+            questions = self._pages.get(key)
+            if questions is not None:
+                self._pages.move_to_end(key)
+                return questions
+        questions = self._read_page(page, per_page)
+        with self._lock:
+            self._pages[key] = questions
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.cache_pages:
+                self._pages.popitem(last=False)
+        return questions
+
+    def _prefetch(self, pages: list, per_page: int):
+        for page in pages:
+            with self._lock:
+                if (page, per_page) in self._pages:
+                    continue
+            self._cached_page(page, per_page)
+
+    def page(self, page: int, per_page: int) -> tuple:
+        questions = self._cached_page(page, per_page)
+        if self.prefetch:
+            neighbours = [p for p in (page + 1, page - 1) if 1 <= p <= self.total_pages(per_page)]
+            if neighbours:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bank-prefetch")
+                self._executor.submit(self._prefetch, neighbours, per_page)
+        return questions
+
+
+def load_question_bank(path: str, lazy: bool = None):
+    """Return the cached bank for `path`, re-parsing only if the file changed.
+
+    The cheap (mtime, size) stat check runs on every call; the content hash is
+    only computed when the stat changed, so touching the file without editing
+    it does not trigger a re-parse. Both the JSON and the JSON Lines (*.jsonl)
+    formats are accepted. JSON Lines banks are opened as a LazyQuestionBank
+    unless `lazy` is False.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    stat_key = (st.st_mtime_ns, st.st_size)
+    jsonl = path.endswith(".jsonl")
+    lazy = jsonl if lazy is None else lazy and jsonl
+    cache_key = (path, lazy)
+
+    with _cache_lock:
+        entry = _cache.get(cache_key)
+        if entry is not None and entry["stat"] == stat_key:
+            return entry["bank"]
+
+        if jsonl:
+            digest = file_digest(path)
+        else:
+            with open(path, "rb") as f:
+                raw = f.read()
+            digest = hashlib.sha1(raw).hexdigest()
+        if entry is not None and entry["bank"].fingerprint == digest:
+            entry["stat"] = stat_key
+            return entry["bank"]
+
+        if lazy:
+            bank = LazyQuestionBank(path, digest)
+        elif jsonl:
+            # Parsed line by line; the raw file is never held in memory as a whole
+            with open(path, "r", encoding="utf-8") as f:
+                bank = QuestionBank(_read_jsonl(f), digest)
+        else:
+            bank = QuestionBank(json.loads(raw.decode("utf-8")), digest)
+        _cache[cache_key] = {"stat": stat_key, "bank": bank}
+        return bank
+
+
+# --- Command line: convert a question file into the compiled (or .jsonl) format ---
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile a question file into the compact bank format.")
+    parser.add_argument("input")
+    parser.add_argument("output", help="*.jsonl writes the JSON Lines format")
+    args = parser.parse_args()
+
+    if args.input.endswith(".jsonl"):
+        with open(args.input, "r", encoding="utf-8") as f:
+            bank = _read_jsonl(f)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            bank = _as_compiled(json.load(f))
+
+    choice_sets = bank["choice_sets"]
+    with QuestionBankWriter(args.output, bank["variants"]) as writer:
+        for record in bank["questions"]:
+            writer.add({"id": record["id"], "question": record["html"],
+                        "choices": choice_sets[record["choice_set"]]})
+    print(f"✅ Wrote {writer.count} questions with {len(choice_sets)} choice set(s) to {args.output}")
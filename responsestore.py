@@ -0,0 +1,398 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+
+from fileio import atomic_write_json
+
+# Pluggable storage for annotator responses.
+#
+# Every backend exposes the same operations used by app.py:
+#   load(annotator_id) -> {question_id: answer}
+#   set_answer(annotator_id, qid, answer)
+#   is_page_submitted(annotator_id, page) -> bool
+#   submit_page(annotator_id, page, page_data, answers=None)
+
+
+class ResponseStore(ABC):
+    @abstractmethod
+    def load(self, annotator_id: str) -> dict:
+        """All in-progress answers of the annotator, {question_id: answer}."""
+
+    @abstractmethod
+    def set_answer(self, annotator_id: str, qid: str, answer: str):
+        """Store one in-progress answer."""
+
+    def set_answers(self, annotator_id: str, answers: dict):
+        """Store several answers at once; backends override this with a single write."""
+        for qid, answer in answers.items():
+            self.set_answer(annotator_id, qid, answer)
+
+    @abstractmethod
+    def is_page_submitted(self, annotator_id: str, page: int) -> bool:
+        """Whether the page is locked."""
+
+    @abstractmethod
+    def submit_page(self, annotator_id: str, page: int, page_data: dict, answers: dict = None):
+        """Lock the page; `answers` (changed in-progress answers) are stored in the same call."""
+
+
+class FileResponseStore(ResponseStore):
+    """One snapshot file per annotator plus one file per submitted page."""
+
+    def __init__(self, responses_dir: str, submitted_dir: str):
+        self.responses_dir = responses_dir
+        self.submitted_dir = submitted_dir
+        os.makedirs(responses_dir, exist_ok=True)
+        os.makedirs(submitted_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def snapshot_path(self, annotator_id: str) -> str:
+        return os.path.join(self.responses_dir, f"{annotator_id}.json")
+
+    def submitted_path(self, annotator_id: str, page: int) -> str:
+        return os.path.join(self.submitted_dir, f"{annotator_id}_pg{page}.json")
+
+    def _read_snapshot(self, annotator_id: str) -> dict:
+        path = self.snapshot_path(annotator_id)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def is_page_submitted(self, annotator_id: str, page: int) -> bool:
+        return os.path.exists(self.submitted_path(annotator_id, page))
+
+    def submit_page(self, annotator_id: str, page: int, page_data: dict, answers: dict = None):
+        # Answers first: a crash in between leaves them saved and the page unlocked
+        if answers:
+            self.set_answers(annotator_id, answers)
+        atomic_write_json(self.submitted_path(annotator_id, page), page_data)
+
+
+class JsonFileStore(FileResponseStore):
+    """Original layout: the whole response dict is rewritten on every change."""
+
+    def load(self, annotator_id: str) -> dict:
+        return self._read_snapshot(annotator_id)
+
+    def set_answer(self, annotator_id: str, qid: str, answer: str):
+        self.set_answers(annotator_id, {qid: answer})
+
+    def set_answers(self, annotator_id: str, answers: dict):
+        with self._lock:
+            responses = self._read_snapshot(annotator_id)
+            responses.update(answers)
+            atomic_write_json(self.snapshot_path(annotator_id), responses)
+
+
+class JournalStore(FileResponseStore):
+    """Snapshot plus an append-only journal of answer events.
+
+    Each answer appends one fsync'd line to `<id>.journal`, so the cost of a
+    click does not depend on how many questions were already answered. Once the
+    journal reaches `compact_every` lines it is folded into the `<id>.json`
+    snapshot (same format JsonFileStore uses) and truncated. Replaying the
+    journal is idempotent, so a crash at any point loses at most the event
+    being written, and a torn trailing line is skipped on load.
+    """
+
+    def __init__(self, responses_dir: str, submitted_dir: str, compact_every: int = 200):
+        super().__init__(responses_dir, submitted_dir)
+        self.compact_every = compact_every
+        self._state = {}
+
+    def journal_path(self, annotator_id: str) -> str:
+        return os.path.join(self.responses_dir, f"{annotator_id}.journal")
+
+    def _read(self, annotator_id: str):
+        """Snapshot plus journal, read without touching either file.
+
+        Returns (responses, journal lines, length of the journal's intact part).
+        """
+        responses = self._read_snapshot(annotator_id)
+        lines = good_end = 0
+        path = self.journal_path(annotator_id)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn write from a killed process
+                    good_end += len(line)
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    responses[str(event["qid"])] = event["answer"]
+                    lines += 1
+        return responses, lines, good_end
+
+    def _replay(self, annotator_id: str):
+        responses, lines, good_end = self._read(annotator_id)
+        path = self.journal_path(annotator_id)
+        if os.path.exists(path) and good_end != os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(good_end)
+                os.fsync(f.fileno())
+        return {"responses": responses, "journal_lines": lines}
+
+    def _get_state(self, annotator_id: str) -> dict:
+        state = self._state.get(annotator_id)
+        if state is None:
+            state = self._replay(annotator_id)
+            self._state[annotator_id] = state
+            if state["journal_lines"] >= self.compact_every:
+                self._compact(annotator_id, state)
+        return state
+
+    def _compact(self, annotator_id: str, state: dict):
+        atomic_write_json(self.snapshot_path(annotator_id), state["responses"])
+        with open(self.journal_path(annotator_id), "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        state["journal_lines"] = 0
+
+    def load(self, annotator_id: str) -> dict:
+        with self._lock:
+            return dict(self._get_state(annotator_id)["responses"])
+
+    def load_readonly(self, annotator_id: str) -> dict:
+        """Like load(), but never truncates a torn journal or compacts, e.g. to copy a tree."""
+        return self._read(annotator_id)[0]
+
+    def set_answer(self, annotator_id: str, qid: str, answer: str):
+        self.set_answers(annotator_id, {qid: answer})
+
+    def set_answers(self, annotator_id: str, answers: dict):
+        """Append one line per answer with a single write and fsync."""
+        lines = "".join(
+            json.dumps({"qid": qid, "answer": answer}, ensure_ascii=False) + "\n"
+            for qid, answer in answers.items()
+        )
+        with self._lock:
+            state = self._get_state(annotator_id)
+            with open(self.journal_path(annotator_id), "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            state["responses"].update(answers)
+            state["journal_lines"] += len(answers)
+            if state["journal_lines"] >= self.compact_every:
+                self._compact(annotator_id, state)
+
+    def compact(self, annotator_id: str):
+        with self._lock:
+            self._compact(annotator_id, self._get_state(annotator_id))
+
+
+# --- SQLite backend ---
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    annotator_id TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (annotator_id, question_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS submitted_pages (
+    annotator_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    submitted_at TEXT NOT NULL,
+    PRIMARY KEY (annotator_id, page)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS submitted_answers (
+    annotator_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    question_id TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    PRIMARY KEY (annotator_id, page, question_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_submitted_answers_question
+    ON submitted_answers (question_id);
+"""
+
+
+class SqliteConnectionPool:
+    """A bounded pool of connections to one database file, shared process-wide.
+
+    Streamlit runs each full rerun on a new ScriptRunner thread, so connections
+    are not tied to threads. Callers check a connection out for one operation
+    (`with pool.connection() as conn:`, which also commits or rolls back) and
+    it goes back to the pool afterwards. Connections are opened lazily, with
+    the WAL PRAGMAs run once per connection, up to `size`; beyond that callers
+    wait up to `timeout` seconds for one to be returned.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, timeout: float = 30.0):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        self._opened = 1
+        self._idle.put(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            grow = self._opened < self.size
+            if grow:
+                self._opened += 1
+        if not grow:
+            try:
+                return self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No free SQLite connection to {self.db_path} after {self.timeout}s")
+        try:
+            return self._connect()
+        except BaseException:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close the idle connections (all of them once every caller is done)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_sqlite_pool(db_path: str) -> SqliteConnectionPool:
+    db_path = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = SqliteConnectionPool(db_path)
+            _pools[db_path] = pool
+        return pool
+
+
+class SqliteStore(ResponseStore):
+    """Responses and page submissions in indexed SQLite tables (WAL mode)."""
+
+    def __init__(self, db_path: str):
+        self.pool = get_sqlite_pool(db_path)
+
+    def load(self, annotator_id: str) -> dict:
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT question_id, answer FROM responses WHERE annotator_id = ?",
+                (annotator_id,),
+            ).fetchall()
+        return dict(rows)
+
+    def set_answer(self, annotator_id: str, qid: str, answer: str):
+        self.set_answers(annotator_id, {qid: answer})
+
+    def set_answers(self, annotator_id: str, answers: dict):
+        with self.pool.connection() as conn:
+            self._write_answers(conn, annotator_id, answers, datetime.utcnow().isoformat())
+
+    @staticmethod
+    def _write_answers(conn, annotator_id: str, answers: dict, now: str):
+        conn.executemany(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+            [(annotator_id, str(qid), answer, now) for qid, answer in answers.items()],
+        )
+
+    def is_page_submitted(self, annotator_id: str, page: int) -> bool:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM submitted_pages WHERE annotator_id = ? AND page = ?",
+                (annotator_id, page),
+            ).fetchone()
+        return row is not None
+
+    def submit_page(self, annotator_id: str, page: int, page_data: dict, answers: dict = None):
+        """Store `answers` and lock the page in one transaction."""
+        now = datetime.utcnow().isoformat()
+        with self.pool.connection() as conn:
+            if answers:
+                self._write_answers(conn, annotator_id, answers, now)
+            self._write_submission(conn, annotator_id, page, page_data, now)
+
+    def import_submission(self, annotator_id: str, page: int, page_data: dict, submitted_at: str):
+        with self.pool.connection() as conn:
+            self._write_submission(conn, annotator_id, page, page_data, submitted_at)
+
+    @staticmethod
+    def _write_submission(conn, annotator_id: str, page: int, page_data: dict, submitted_at: str):
+        conn.execute(
+            "INSERT OR REPLACE INTO submitted_pages VALUES (?, ?, ?)",
+            (annotator_id, page, submitted_at),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO submitted_answers VALUES (?, ?, ?, ?)",
+            [(annotator_id, page, str(qid), answer) for qid, answer in page_data.items()],
+        )
+
+    def submitted_answers(self) -> list:
+        """All submitted (annotator_id, page, question_id, answer) rows."""
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT annotator_id, page, question_id, answer FROM submitted_answers "
+                "ORDER BY annotator_id, page, question_id"
+            ).fetchall()
+
+
+# --- Backend registry ---
+BACKENDS = {
+    "json": JsonFileStore,
+    "journal": JournalStore,
+    "sqlite": SqliteStore,
+}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_response_store(backend: str, **options) -> ResponseStore:
+    """Return the process-wide store for `backend`, creating it on first use."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend {backend!r}; expected one of {sorted(BACKENDS)}")
+    key = (backend, tuple(sorted(options.items())))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = BACKENDS[backend](**options)
+            _stores[key] = store
+        return store
@@ -1,65 +1,77 @@
 import streamlit as st
-import json
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
 
-# --- Google Sheets: Load + Save ---
-def load_responses_from_sheet(annotator_id: str) -> dict:
-    creds_dict = json.loads(st.secrets["gspread"]["gcp_service_account"])
-    spreadsheet_id = st.secrets["gspread"]["spreadsheet_id"]
-    worksheet_name = st.secrets["gspread"]["worksheet_name"]
-
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
-    worksheet = client.open_by_key(spreadsheet_id).worksheet(worksheet_name)
+import repo_root  # noqa: F401  (makes the shared root modules importable)
+import perf
+from questionbank import load_question_bank
+from gspreadpool import GSpreadPool, append_page_rows
+from fakesheets import FakeGSpreadClient, get_fake_backend
 
+# --- Google Sheets: Load + Save ---
+@st.cache_resource
+def get_gspread_pool() -> GSpreadPool:
+    return GSpreadPool.from_secrets(st.secrets["gspread"])
+
+@st.cache_resource
+def get_fake_worksheet():
+    client = FakeGSpreadClient(
+        get_fake_backend(**FAKE_SHEETS_OPTIONS), headers={"sheet1": SUBMISSION_COLUMNS}
+    )
+    return client.open_by_key("fake").worksheet("sheet1")
+
+def get_worksheet():
+    if SHEETS_BACKEND == "fake":
+        return get_fake_worksheet()
+    return get_gspread_pool().worksheet(
+        st.secrets["gspread"]["spreadsheet_id"],
+        st.secrets["gspread"]["worksheet_name"],
+    )
+
+def forget_rejected_credentials(error: Exception):
+    # A 401 means the pooled client's credentials were revoked; authorize again next time
+    if SHEETS_BACKEND != "fake":
+        get_gspread_pool().invalidate_on_auth_error(error)
+
+def load_responses_from_sheet(all_rows: list, annotator_id: str) -> dict:
     responses = {}
-    all_rows = worksheet.get_all_records()
     for row in all_rows:
         if row["annotator_id"] == annotator_id:
             responses[str(row["question_id"])] = row["answer"]
     return responses
 
-def page_already_submitted(annotator_id: str, page: int, total_questions: int) -> bool:
-    creds_dict = json.loads(st.secrets["gspread"]["gcp_service_account"])
-    spreadsheet_id = st.secrets["gspread"]["spreadsheet_id"]
-    worksheet_name = st.secrets["gspread"]["worksheet_name"]
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
-    worksheet = client.open_by_key(spreadsheet_id).worksheet(worksheet_name)
-    all_rows = worksheet.get_all_records()
-    count = sum(1 for row in all_rows if row["annotator_id"] == annotator_id and row["page"] == page)
-    return count >= total_questions
+def page_already_submitted(all_rows: list, annotator_id: str, page: int) -> bool:
+    # A page is only ever appended whole, so any row of it means it was submitted
+    # (the last page can be shorter than QUESTIONS_PER_PAGE)
+    return any(
+        str(row["annotator_id"]) == annotator_id and str(row["page"]) == str(page)
+        for row in all_rows
+    )
 
 def save_to_gsheet(responses: dict, annotator_id: str, page: int):
-    creds_dict = json.loads(st.secrets["gspread"]["gcp_service_account"])
-    spreadsheet_id = st.secrets["gspread"]["spreadsheet_id"]
-    worksheet_name = st.secrets["gspread"]["worksheet_name"]
-
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
-    worksheet = client.open_by_key(spreadsheet_id).worksheet(worksheet_name)
+    # Only reached when page_already_submitted() said no earlier in this rerun
+    worksheet = get_worksheet()
 
     now = datetime.utcnow().isoformat()
-    for qid, answer in responses.items():
-        worksheet.append_row([now, annotator_id, page, qid, answer])
+    rows = [[now, annotator_id, page, qid, answer] for qid, answer in responses.items()]
+    append_page_rows(worksheet, rows, annotator_id, page)
 
 # --- Config ---
 QUESTIONS_PER_PAGE = 10
-QUESTIONS_FILE = "questions.json"
+QUESTIONS_FILE = "questions.json"  # or a streamed questions.jsonl bank
+SHEETS_BACKEND = "gsheets"  # "gsheets" or "fake" (local stand-in, see fakesheets.py)
+FAKE_SHEETS_OPTIONS = {}  # e.g. {"latency": 0.3, "quota_per_minute": 60, "db_path": "fake_sheets.sqlite3"}
+SUBMISSION_COLUMNS = ["timestamp", "annotator_id", "page", "question_id", "answer"]
+PERF_ENABLED = False  # rerun timings; also switched on by ANNOTATION_PERF=1
+PERF_ADMINS = {"Maja"}  # annotators who see the timing panel (with the gspread pool's hit counts)
+
+if PERF_ENABLED:
+    perf.enable()
+perf_session = perf.session_recorder(st.session_state)
 
 # --- Load Questions ---
-with open(QUESTIONS_FILE, "r", encoding="utf-8") as f:
-    questions = json.load(f)
+questions = load_question_bank(QUESTIONS_FILE)
 
-total_pages = (len(questions) - 1) // QUESTIONS_PER_PAGE + 1
+total_pages = questions.total_pages(QUESTIONS_PER_PAGE)
 
 # --- Annotator Login ---
 st.title("Annotation Task")
@@ -75,12 +87,19 @@ if annotator_id not in ALLOWED_ANNOTATORS:
     st.error(f"❌ '{annotator_id}' is not a valid annotator ID.")
     st.stop()
 
-responses = load_responses_from_sheet(annotator_id)
+# One sheet download per rerun, shared by the response load and the submitted check
+with perf.phase("sheets_read", perf_session):
+    try:
+        sheet_rows = get_worksheet().get_all_records()
+    except Exception as e:
+        forget_rejected_credentials(e)
+        raise
+responses = questions.decode_responses(load_responses_from_sheet(sheet_rows, annotator_id))
 
 # --- Determine first unanswered page ---
 def find_first_unanswered_page():
-    for idx, q in enumerate(questions):
-        if str(q["id"]) not in responses:
+    for idx, qid in enumerate(questions.ids()):
+        if qid not in responses:
             return idx // QUESTIONS_PER_PAGE + 1
     return 1
 
@@ -97,19 +116,17 @@ st.number_input(
 )
 
 page = st.session_state.page
-start_idx = (page - 1) * QUESTIONS_PER_PAGE
-end_idx = min(start_idx + QUESTIONS_PER_PAGE, len(questions))
 
-page_submitted = page_already_submitted(annotator_id, page, QUESTIONS_PER_PAGE)
+page_submitted = page_already_submitted(sheet_rows, annotator_id, page)
 
 # --- Question Loop ---
 updated = False
 all_answered = True
 
-for q in questions[start_idx:end_idx]:
+for q in questions.page(page, QUESTIONS_PER_PAGE):
     qid = str(q["id"])
     saved_choice = responses.get(qid, None)
-    choices = q["choices"]
+    choices = list(q["choices"])
 
     if saved_choice in choices:
         display_choices = choices
@@ -151,13 +168,20 @@ if all_answered and not page_submitted:
     if st.button("✅ Submit This Page"):
         page_data = {
             str(q["id"]): responses[str(q["id"])]
-            for q in questions[start_idx:end_idx]
+            for q in questions.page(page, QUESTIONS_PER_PAGE)
         }
         try:
-            save_to_gsheet(page_data, annotator_id, page)
+            with perf.phase("submit_page", perf_session):
+                save_to_gsheet(questions.encode_responses(page_data), annotator_id, page)
             st.success(f"✅ Page {page} submitted and saved to Google Sheets.")
             st.rerun()
         except Exception as e:
+            forget_rejected_credentials(e)
             st.error(f"❌ Failed to save to Google Sheets: {e}")
 elif page_submitted:
-    st.info("✅ This page has been submitted and cannot be changed.")
\ No newline at end of file
+    st.info("✅ This page has been submitted and cannot be changed.")
+
+# --- Timings ---
+if perf.is_enabled() and annotator_id in PERF_ADMINS:
+    counters = {} if SHEETS_BACKEND == "fake" else {"gspread pool": get_gspread_pool().stats}
+    perf.render_panel(perf_session, counters)
@@ -3,8 +3,21 @@ from streamlit_gsheets import GSheetsConnection
 from datetime import datetime
 import pandas as pd
 
+from fakesheets import FakeGSheetsConnection, get_fake_backend
+
+# --- Config ---
+SHEETS_BACKEND = "gsheets"  # "gsheets" or "fake" (local stand-in, see fakesheets.py)
+FAKE_SHEETS_OPTIONS = {}  # e.g. {"latency": 0.3, "quota_per_minute": 60, "db_path": "fake_sheets.sqlite3"}
+
 # --- Connect to the Google Sheet ---
-conn = st.connection("gsheets", type=GSheetsConnection)
+@st.cache_resource
+def get_fake_connection() -> FakeGSheetsConnection:
+    return FakeGSheetsConnection(backend=get_fake_backend(**FAKE_SHEETS_OPTIONS))
+
+if SHEETS_BACKEND == "fake":
+    conn = get_fake_connection()
+else:
+    conn = st.connection("gsheets", type=GSheetsConnection)
 df = conn.read()
 
 st.title("📝 Annotation Logger")
@@ -1,27 +1,18 @@
+import gspread
 import streamlit as st
-import json
 import pandas as pd
 from datetime import datetime
 from streamlit_gsheets import GSheetsConnection
 
+import repo_root  # noqa: F401  (makes the shared root modules importable)
+import perf
+from questionbank import load_question_bank
+from fakesheets import FakeGSheetsConnection, FakeGSpreadClient, get_fake_backend
+from sheetqueue import LIVE_COLUMNS, LiveSheetBackend, WriteBehindQueue
+from sheetsnapshot import AnnotatorSheetSnapshot, get_sheet_snapshot
+
 # --- Google Sheets Helper ---
-def load_responses_from_sheet(conn: GSheetsConnection, annotator_id: str) -> dict:
-    responses = {}
-    df = conn.read(worksheet=annotator_id)
-    if df is None or df.empty:
-        return responses
-    for _, row in df.iterrows():
-        responses[str(row["question_id"])] = row["answer"]
-    return responses
-
-def page_already_submitted(conn: GSheetsConnection, annotator_id: str, page: int, total_questions: int) -> bool:
-    df = conn.read(worksheet=annotator_id)
-    if df is None or df.empty:
-        return False
-    count = df[(df["page"] == page)].shape[0]
-    return count >= total_questions
-
-def save_final_submission(conn, responses: dict, annotator_id: str, page: int):
+def save_final_submission(conn, snapshot: AnnotatorSheetSnapshot, responses: dict, annotator_id: str, page: int):
     now = datetime.utcnow().isoformat()
     new_rows = [
         {
@@ -35,50 +26,77 @@ def save_final_submission(conn, responses: dict, annotator_id: str, page: int):
     ]
     
     try:
-        existing_df = conn.read(worksheet=annotator_id)
-        updated_df = pd.concat([existing_df, pd.DataFrame(new_rows)], ignore_index=True)
+        # update() replaces the whole worksheet, so start from a fresh read rather
+        # than the session's (up to TTL old) copy, which may miss other writes
+        snapshot.refresh()
+        if page in snapshot.submitted_pages:
+            st.info(f"✅ Page {page} was already submitted.")
+            return
+        updated_df = pd.concat([snapshot.df, pd.DataFrame(new_rows)], ignore_index=True)
         conn.update(worksheet=annotator_id, data=updated_df)
+        snapshot.record_rows(new_rows)
         st.success("✅ Saved final submission.")
     except Exception as e:
         st.error(f"❌ Error saving to sheet for {annotator_id}: {e}")
 
-def save_live_response(conn, annotator_id: str, page: int, qid: str, answer: str):
-    now = datetime.utcnow().isoformat()
-    new_row = {
-        "timestamp": now,
-        "annotator_id": annotator_id,
-        "page": page,
-        "question_id": qid,
-        "answer": answer
-    }
-
-    try:
-        sheet_df = conn.read(worksheet="sheet1")
-        sheet_df = sheet_df if sheet_df is not None else pd.DataFrame(columns=new_row.keys())
-
-        # Remove any previous response for this annotator/page/qid
-        mask = ~(
-            (sheet_df["annotator_id"] == annotator_id) &
-            (sheet_df["page"] == page) &
-            (sheet_df["question_id"] == qid)
-        )
-        sheet_df = sheet_df[mask]
-
-        # Append new response and write back
-        sheet_df = pd.concat([sheet_df, pd.DataFrame([new_row])], ignore_index=True)
-        conn.update(worksheet="sheet1", data=sheet_df)
-    except Exception as e:
-        st.error(f"❌ Failed live save to sheet1: {e}")
-
 # --- Config ---
 QUESTIONS_PER_PAGE = 10
-QUESTIONS_FILE = "questions.json"
+INTERACTION_MODE = "live"  # "live" (queued sheet save per click) or "batch" (one form per page, one sheet call on submit)
+QUESTIONS_FILE = "questions.json"  # or a streamed questions.jsonl bank
+SHEETS_BACKEND = "gsheets"  # "gsheets" or "fake" (local stand-in, see fakesheets.py)
+FAKE_SHEETS_OPTIONS = {}  # e.g. {"latency": 0.3, "quota_per_minute": 60, "db_path": "fake_sheets.sqlite3"}
+LIVE_SAVE_FLUSH_SECONDS = 5
+LIVE_SAVE_BATCH_SIZE = 50
+SHEET_SNAPSHOT_TTL_SECONDS = 300
+PERF_ENABLED = False  # rerun timings; also switched on by ANNOTATION_PERF=1
+PERF_ADMINS = {"Maja"}  # annotators who see the timing panel
+PERF_METRICS_FILE = "perf_metrics.prom"
+PERF_DUMP_SECONDS = 30
+
+if PERF_ENABLED:
+    perf.enable()
+perf_session = perf.session_recorder(st.session_state)
+
+def show_timings(annotator_id: str):
+    if perf.is_enabled():
+        perf.PROCESS.maybe_dump(PERF_METRICS_FILE, PERF_DUMP_SECONDS)
+        if annotator_id in PERF_ADMINS:
+            perf.render_panel(perf_session)
+
+@st.cache_resource
+def get_fake_connection() -> FakeGSheetsConnection:
+    return FakeGSheetsConnection(backend=get_fake_backend(**FAKE_SHEETS_OPTIONS))
+
+def get_connection():
+    if SHEETS_BACKEND == "fake":
+        return get_fake_connection()
+    return st.connection("gsheets", type=GSheetsConnection)
+
+# Live saves go through gspread, which can append and update single rows
+@st.cache_resource
+def get_live_worksheet():
+    if SHEETS_BACKEND == "fake":
+        # Created with its header, like the real sheet1
+        client = FakeGSpreadClient(get_fake_backend(**FAKE_SHEETS_OPTIONS), headers={"sheet1": LIVE_COLUMNS})
+        return client.open_by_key("fake").worksheet("sheet1")
+    secrets = st.secrets["connections"]["gsheets"].to_dict()
+    client = gspread.service_account_from_dict(secrets)
+    return client.open_by_url(secrets["spreadsheet"]).worksheet("sheet1")
+
+# One live-save queue per process, so pending answers survive reruns
+@st.cache_resource
+def get_live_queue() -> WriteBehindQueue:
+    return WriteBehindQueue(
+        LiveSheetBackend(get_live_worksheet()),
+        flush_interval=LIVE_SAVE_FLUSH_SECONDS,
+        max_pending=LIVE_SAVE_BATCH_SIZE,
+    )
 
 # --- Load Questions ---
-with open(QUESTIONS_FILE, "r", encoding="utf-8") as f:
-    questions = json.load(f)
+with perf.phase("load_questions", perf_session):
+    questions = load_question_bank(QUESTIONS_FILE)
 
-total_pages = (len(questions) - 1) // QUESTIONS_PER_PAGE + 1
+total_pages = questions.total_pages(QUESTIONS_PER_PAGE)
 
 # --- Annotator Login ---
 st.title("Annotation Task")
@@ -95,14 +113,23 @@ if annotator_id not in ALLOWED_ANNOTATORS:
     st.stop()
 
 # --- GSheets Connection ---
-conn = st.connection("gsheets", type=GSheetsConnection)
+conn = get_connection()
+live_queue = get_live_queue()
 
-responses = load_responses_from_sheet(conn, annotator_id)
+if live_queue.last_error is not None:
+    st.warning(f"⚠️ Live save to sheet1 is retrying: {live_queue.last_error}")
+
+# One worksheet read per session (plus TTL refreshes) instead of two per rerun
+with perf.phase("sheets_read", perf_session):
+    snapshot = get_sheet_snapshot(
+        st.session_state, conn, annotator_id, ttl=SHEET_SNAPSHOT_TTL_SECONDS
+    )
+    responses = questions.decode_responses(snapshot.responses)
 
 # --- Determine first unanswered page ---
 def find_first_unanswered_page():
-    for idx, q in enumerate(questions):
-        if str(q["id"]) not in responses:
+    for idx, qid in enumerate(questions.ids()):
+        if qid not in responses:
             return idx // QUESTIONS_PER_PAGE + 1
     return 1
 
@@ -119,57 +146,103 @@ st.number_input(
 )
 
 page = st.session_state.page
-start_idx = (page - 1) * QUESTIONS_PER_PAGE
-end_idx = min(start_idx + QUESTIONS_PER_PAGE, len(questions))
 
-page_submitted = page_already_submitted(conn, annotator_id, page, QUESTIONS_PER_PAGE)
+with perf.phase("check_submitted", perf_session):
+    page_submitted = snapshot.is_page_submitted(page)
+
+PLACEHOLDER = "⬜ Please select an answer"
+
+if INTERACTION_MODE == "batch":
+    # --- Page Form ---
+    # Answers stay in the browser until the page is submitted, which writes
+    # the page to the annotator's worksheet in a single sheet call.
+    with perf.phase("render_page", perf_session), st.form(f"page_form_{page}"):
+        keys = {}
+        for q in questions.page(page, QUESTIONS_PER_PAGE):
+            qid = str(q["id"])
+            keys[qid] = f"{annotator_id}_form_q_{qid}"
+            display_choices = [PLACEHOLDER] + list(q["choices"])
+            saved_choice = responses.get(qid, None)
+
+            st.radio(
+                f"Q{qid}: {q['question']}",
+                options=display_choices,
+                index=display_choices.index(saved_choice) if saved_choice in display_choices else 0,
+                key=keys[qid],
+                disabled=page_submitted
+            )
+            st.markdown("---")
+
+        submit_clicked = st.form_submit_button("✅ Submit This Page", disabled=page_submitted)
+
+    if submit_clicked:
+        page_data = {qid: st.session_state[key] for qid, key in keys.items()}
+        unanswered = [qid for qid, selected in page_data.items() if selected == PLACEHOLDER]
+        if unanswered:
+            st.warning(f"Please answer all questions before submitting (missing: {', '.join(unanswered)}).")
+        else:
+            with perf.phase("submit_page", perf_session):
+                save_final_submission(conn, snapshot, questions.encode_responses(page_data), annotator_id, page)
+            st.rerun()
+    elif page_submitted:
+        st.info("✅ This page has already been submitted and cannot be changed.")
+    show_timings(annotator_id)
+    st.stop()
 
 # --- Question Loop ---
 all_answered = True
 page_data = {}
+live_saved = st.session_state.setdefault("live_saved", {})
+
+with perf.phase("render_page", perf_session):
+    for q in questions.page(page, QUESTIONS_PER_PAGE):
+        qid = str(q["id"])
+        choices = list(q["choices"])
+        key = f"{annotator_id}_q_{qid}"
+
+        saved_choice = responses.get(qid, None)
+        default_index = choices.index(saved_choice) if saved_choice in choices else 0
+        display_choices = [PLACEHOLDER] + choices
+        index = display_choices.index(saved_choice) if saved_choice in display_choices else 0
+
+        selected = st.radio(
+            f"Q{qid}: {q['question']}",
+            options=display_choices,
+            index=index,
+            key=key,
+            disabled=page_submitted
+        )
 
-for q in questions[start_idx:end_idx]:
-    qid = str(q["id"])
-    choices = q["choices"]
-    key = f"{annotator_id}_q_{qid}"
-
-    saved_choice = responses.get(qid, None)
-    default_index = choices.index(saved_choice) if saved_choice in choices else 0
-    display_choices = ["⬜ Please select an answer"] + choices
-    index = display_choices.index(saved_choice) if saved_choice in display_choices else 0
-
-    selected = st.radio(
-        f"Q{qid}: {q['question']}",
-        options=display_choices,
-        index=index,
-        key=key,
-        disabled=page_submitted
-    )
+        if selected == PLACEHOLDER:
+            all_answered = False
+        else:
+            page_data[qid] = selected
+            if not page_submitted and selected != saved_choice and live_saved.get(qid) != selected:
+                with perf.phase("live_save", perf_session):
+                    live_queue.put(annotator_id, page, qid, questions.encode_answer(qid, selected))
+                live_saved[qid] = selected
 
-    if selected == "⬜ Please select an answer":
-        all_answered = False
-    else:
-        page_data[qid] = selected
-        if not page_submitted and selected != saved_choice:
-            save_live_response(conn, annotator_id, page, qid, selected)
-
-    # Highlight unanswered
-    if selected == "⬜ Please select an answer":
-        st.markdown(
-            f'<div style="background-color:#3E3E3D;padding:10px;border-radius:5px">Please answer this question</div>',
-            unsafe_allow_html=True
-        )
+        # Highlight unanswered
+        if selected == PLACEHOLDER:
+            st.markdown(
+                f'<div style="background-color:#3E3E3D;padding:10px;border-radius:5px">Please answer this question</div>',
+                unsafe_allow_html=True
+            )
 
-    st.markdown("---")
+        st.markdown("---")
 
 # --- Submit Page ---
 if all_answered and not page_submitted:
     if st.button("✅ Submit This Page"):
         try:
-            save_final_submission(conn, page_data, annotator_id, page)
+            with perf.phase("submit_page", perf_session):
+                live_queue.flush()
+                save_final_submission(conn, snapshot, questions.encode_responses(page_data), annotator_id, page)
             st.success(f"✅ Page {page} submitted and saved to {annotator_id}'s worksheet.")
             st.rerun()
         except Exception as e:
             st.error(f"❌ Failed to save final submission: {e}")
 elif page_submitted:
     st.info("✅ This page has already been submitted and cannot be changed.")
+
+show_timings(annotator_id)
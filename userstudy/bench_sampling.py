@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from sampling import BalancedSampler
+
+# Synthetic benchmark for sampling.py: times greedy and optimal sampling on
+# candidate pools of increasing size.
+#
+#   python bench_sampling.py
+
+SIZES = [10_000, 100_000, 1_000_000]
+N_IMAGES = 40_000
+CATEGORIES = [1, 2, 3]
+SIM_LEVELS = [1, 2, 3, 4]
+TARGET_TOTAL = 500
+
+
+def make_candidates(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "image_id": rng.integers(0, N_IMAGES, n_rows),
+        "gt_verb_synset": rng.integers(0, 100, n_rows).astype(str),
+        "gt_object_synset": rng.integers(0, 80, n_rows).astype(str),
+        "category": rng.integers(1, 4, n_rows),
+        # Sparse top similarity level, as in the real prediction dumps
+        "similarity_level": rng.choice(5, n_rows, p=[0.3, 0.3, 0.2, 0.15, 0.05]),
+    })
+
+
+def time_run(df: pd.DataFrame, key_columns, mode: str) -> tuple:
+    start = time.perf_counter()
+    sampler = BalancedSampler(
+        df, key_columns, ["category", "similarity_level"],
+        [(c, s) for c in CATEGORIES for s in SIM_LEVELS], TARGET_TOTAL,
+    )
+    out_df = sampler.sample(mode)
+    return time.perf_counter() - start, len(out_df)
+
+
+if __name__ == "__main__":
+    results = []
+    for n_rows in SIZES:
+        df = make_candidates(n_rows)
+        for key_columns in (["image_id"], ["image_id", "gt_verb_synset", "gt_object_synset"]):
+            for mode in ("greedy", "optimal"):
+                seconds, rows = time_run(df, key_columns, mode)
+                results.append((n_rows, "+".join(key_columns), mode, rows, seconds))
+
+    print("\n⏱️ Sampling benchmark")
+    print(f"{'rows':>10}  {'key':<40} {'mode':<8} {'sampled':>7} {'seconds':>8}")
+    for n_rows, key, mode, rows, seconds in results:
+        print(f"{n_rows:>10}  {key:<40} {mode:<8} {rows:>7} {seconds:>8.3f}")
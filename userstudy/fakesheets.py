@@ -0,0 +1,400 @@
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Offline stand-ins for the two Google Sheets APIs the apps use, so the
+# Sheets code paths can run, and be benchmarked, without credentials or
+# network access:
+#
+#   FakeGSheetsConnection   streamlit_gsheets.GSheetsConnection: read / update
+#   FakeGSpreadClient       gspread client -> spreadsheet -> worksheet:
+#                           get_all_records / get_all_values / append_row(s) /
+#                           batch_update
+#
+# Both sit on a FakeSheetsBackend: worksheets stored as rows (first row is the
+# header) in memory or in a SQLite file, plus a simulator that adds per-call
+# latency, a per-minute request quota and random server errors, and counts
+# every request. Latency can be slept for real or only added up in
+# `simulated_seconds`, and randomness is seeded, so batching and caching
+# changes can be compared deterministically.
+
+try:
+    from gspread.exceptions import APIError as _APIError
+except ImportError:  # gspread is only needed by userstudy/app.py
+    class _APIError(Exception):
+        def __init__(self, response):
+            super().__init__(response.text)
+            self.response = response
+
+
+class _ErrorResponse:
+    """The bits of a requests.Response that gspread's APIError reads."""
+
+    def __init__(self, status_code: int, status: str, message: str):
+        self.status_code = status_code
+        self.text = message
+        self._error = {"code": status_code, "status": status, "message": message}
+
+    def json(self) -> dict:
+        return {"error": self._error}
+
+
+class FakeAPIError(_APIError):
+    """Raised for simulated quota and server errors.
+
+    A gspread APIError (when gspread is installed) with `response.status_code`
+    set, so gspreadpool.with_backoff retries it like the real thing.
+    """
+
+    def __init__(self, status_code: int, status: str, message: str):
+        super().__init__(_ErrorResponse(status_code, status, message))
+
+
+# --- Worksheet storage ---
+class MemorySheetStore:
+    def __init__(self):
+        self._sheets = {}
+
+    def names(self) -> list:
+        return sorted(self._sheets)
+
+    def get(self, name: str):
+        rows = self._sheets.get(name)
+        return None if rows is None else [list(row) for row in rows]
+
+    def replace(self, name: str, rows: list):
+        self._sheets[name] = [list(row) for row in rows]
+
+    def create(self, name: str, rows: list):
+        """Store `rows` as worksheet `name` unless it already has rows."""
+        if not self._sheets.get(name):
+            self.replace(name, rows)
+
+    def append(self, name: str, rows: list) -> int:
+        """Append `rows`; returns the position of the first one."""
+        sheet = self._sheets.setdefault(name, [])
+        start = len(sheet)
+        sheet.extend(list(row) for row in rows)
+        return start
+
+    def set_rows(self, name: str, rows: dict):
+        """Overwrite {position: row}, padding the sheet with empty rows if needed."""
+        sheet = self._sheets.setdefault(name, [])
+        for position, row in rows.items():
+            sheet.extend([] for _ in range(position + 1 - len(sheet)))
+            sheet[position] = list(row)
+
+
+class SqliteSheetStore:
+    """Worksheets as JSON-encoded rows in one SQLite table.
+
+    The file outlives the process and can be shared by several processes:
+    every write runs in an IMMEDIATE transaction, so a read-then-write (next
+    append position, create-if-missing) cannot interleave with another one.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sheet_rows ("
+            " worksheet TEXT NOT NULL, position INTEGER NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (worksheet, position)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def names(self) -> list:
+        rows = self._conn.execute("SELECT DISTINCT worksheet FROM sheet_rows ORDER BY worksheet")
+        return [name for (name,) in rows]
+
+    def get(self, name: str):
+        rows = self._conn.execute(
+            "SELECT data FROM sheet_rows WHERE worksheet = ? ORDER BY position", (name,)
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows] or None
+
+    @contextmanager
+    def _write(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        with self._conn:
+            yield
+
+    def replace(self, name: str, rows: list):
+        with self._write():
+            self._conn.execute("DELETE FROM sheet_rows WHERE worksheet = ?", (name,))
+            self._insert(name, rows, 0)
+
+    def create(self, name: str, rows: list):
+        with self._write():
+            exists = self._conn.execute(
+                "SELECT 1 FROM sheet_rows WHERE worksheet = ? LIMIT 1", (name,)
+            ).fetchone()
+            if exists is None:
+                self._insert(name, rows, 0)
+
+    def append(self, name: str, rows: list) -> int:
+        with self._write():
+            (start,) = self._conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM sheet_rows WHERE worksheet = ?", (name,)
+            ).fetchone()
+            self._insert(name, rows, start)
+        return start
+
+    def set_rows(self, name: str, rows: dict):
+        with self._write():
+            (size,) = self._conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM sheet_rows WHERE worksheet = ?", (name,)
+            ).fetchone()
+            padding = [(name, position, "[]") for position in range(size, max(rows, default=-1))
+                       if position not in rows]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sheet_rows VALUES (?, ?, ?)",
+                padding + [(name, position, json.dumps(list(row), default=str))
+                           for position, row in rows.items()],
+            )
+
+    def _insert(self, name: str, rows: list, start: int):
+        self._conn.executemany(
+            "INSERT INTO sheet_rows VALUES (?, ?, ?)",
+            [(name, start + i, json.dumps(list(row), default=str)) for i, row in enumerate(rows)],
+        )
+
+
+# --- Latency, quota and error simulation ---
+class SheetsSimulator:
+    """Per-request latency, a sliding one-minute quota and random 5xx errors.
+
+    Requests over `quota_per_minute` fail with a 429 FakeAPIError, as the
+    Sheets API does once the per-minute read/write quota is used up.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, quota_per_minute: int = None,
+                 error_rate: float = 0.0, seed: int = 0, realtime: bool = True,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.realtime = realtime
+        self.clock = clock
+        self.sleep = sleep
+        self._rng = random.Random(seed)
+        self._window = deque()
+        self.simulated_seconds = 0.0
+
+    def admit(self, operation: str):
+        """Account for one request; returns (delay, error) without waiting.
+
+        The caller serializes admit() calls (they update the quota window and
+        the RNG), then waits out `delay` and raises `error`, if any, itself.
+        """
+        delay = self.latency + (self.jitter * self._rng.random() if self.jitter else 0.0)
+        self.simulated_seconds += delay
+
+        if self.quota_per_minute is not None:
+            now = self.clock()
+            while self._window and now - self._window[0] >= 60.0:
+                self._window.popleft()
+            if len(self._window) >= self.quota_per_minute:
+                return delay, FakeAPIError(429, "RESOURCE_EXHAUSTED",
+                                           f"Quota exceeded: {self.quota_per_minute} requests per minute ({operation})")
+            self._window.append(now)
+
+        if self.error_rate and self._rng.random() < self.error_rate:
+            return delay, FakeAPIError(503, "UNAVAILABLE", f"The service is currently unavailable ({operation})")
+        return delay, None
+
+
+class FakeSheetsBackend:
+    """Worksheet storage plus request simulation, shared by both fake APIs."""
+
+    def __init__(self, store=None, simulator: SheetsSimulator = None):
+        self.store = store if store is not None else MemorySheetStore()
+        self.simulator = simulator if simulator is not None else SheetsSimulator()
+        self.calls = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+        self._store_lock = threading.Lock()
+
+    def request(self, operation: str, fn):
+        """Run one simulated API request against the store.
+
+        Only the bookkeeping is done under the lock; the latency is slept
+        outside it, so concurrent requests wait in parallel as they do against
+        the real API. `fn` then runs under a separate store lock.
+        """
+        with self._lock:
+            self.calls[operation] += 1
+            delay, error = self.simulator.admit(operation)
+            if error is not None:
+                self.errors[error.response.status_code] += 1
+        if delay and self.simulator.realtime:
+            self.simulator.sleep(delay)
+        if error is not None:
+            raise error
+        with self._store_lock:
+            return fn()
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "errors": dict(self.errors),
+            "simulated_seconds": round(self.simulator.simulated_seconds, 6),
+        }
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_fake_backend(db_path: str = None, **simulation) -> FakeSheetsBackend:
+    """Process-wide backend for these options; SQLite-backed when `db_path` is set."""
+    key = (db_path, tuple(sorted(simulation.items())))
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            store = SqliteSheetStore(db_path) if db_path else MemorySheetStore()
+            backend = FakeSheetsBackend(store, SheetsSimulator(**simulation))
+            _backends[key] = backend
+        return backend
+
+
+def _frame_to_rows(df: pd.DataFrame) -> list:
+    # Empty cells come back as "" from Sheets, not NaN
+    values = df.astype(object).where(df.notna(), "").values.tolist()
+    return [[str(col) for col in df.columns]] + values
+
+
+def _rows_to_frame(rows) -> pd.DataFrame:
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows[1:], columns=rows[0])
+
+
+# --- streamlit_gsheets.GSheetsConnection ---
+class FakeGSheetsConnection:
+    """Worksheets with the `read`/`update` API of GSheetsConnection."""
+
+    def __init__(self, worksheets: dict = None, backend: FakeSheetsBackend = None):
+        self.backend = backend if backend is not None else FakeSheetsBackend()
+        for name, df in (worksheets or {}).items():
+            self.backend.store.replace(name, _frame_to_rows(df))
+
+    @property
+    def calls(self) -> Counter:
+        return self.backend.calls
+
+    def read(self, worksheet: str = "sheet1", ttl=None, **kwargs) -> pd.DataFrame:
+        return self.backend.request("read", lambda: _rows_to_frame(self.backend.store.get(worksheet)))
+
+    def update(self, worksheet: str = "sheet1", data: pd.DataFrame = None, **kwargs):
+        rows = _frame_to_rows(data.reset_index(drop=True))
+        self.backend.request("update", lambda: self.backend.store.replace(worksheet, rows))
+        return data
+
+
+# --- gspread ---
+def _column_letter(n: int) -> str:
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def _numericise(value: str):
+    # As gspread.utils.numericise: "3" -> 3, "0.5" -> 0.5, anything else unchanged
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+class FakeWorksheet:
+    def __init__(self, backend: FakeSheetsBackend, title: str):
+        self.backend = backend
+        self.title = title
+
+    def _rows(self) -> list:
+        # The Sheets API returns every cell as a string
+        rows = self.backend.store.get(self.title) or []
+        return [["" if value is None else str(value) for value in row] for row in rows]
+
+    def get_all_values(self) -> list:
+        return self.backend.request("get_all_values", self._rows)
+
+    def get_all_records(self, **kwargs) -> list:
+        def records():
+            rows = self._rows()
+            if not rows:
+                return []
+            header = rows[0]
+            return [
+                {key: _numericise(value) for key, value in zip(header, row + [""] * (len(header) - len(row)))}
+                for row in rows[1:]
+            ]
+        return self.backend.request("get_all_records", records)
+
+    def _append(self, operation: str, values: list) -> dict:
+        def append():
+            start = self.backend.store.append(self.title, values) + 1
+            width = max((len(row) for row in values), default=1)
+            end = start + len(values) - 1
+            return {"updates": {"updatedRange": f"{self.title}!A{start}:{_column_letter(width)}{end}",
+                                "updatedRows": len(values)}}
+        return self.backend.request(operation, append)
+
+    def append_row(self, values: list, **kwargs) -> dict:
+        return self._append("append_row", [values])
+
+    def append_rows(self, values: list, **kwargs) -> dict:
+        return self._append("append_rows", values)
+
+    def batch_update(self, data: list, **kwargs) -> dict:
+        """Write [{"range": "A5:E5", "values": [[...]]}, ...]; ranges must start in column A."""
+        rows = {}
+        for update in data:
+            match = re.fullmatch(r"A(\d+)(?::[A-Z]+\d+)?", update["range"])
+            if match is None:
+                raise ValueError(f"Unsupported range {update['range']!r}")
+            first = int(match.group(1)) - 1
+            for offset, row in enumerate(update["values"]):
+                rows[first + offset] = row
+        self.backend.request("batch_update", lambda: self.backend.store.set_rows(self.title, rows))
+        return {"totalUpdatedRows": len(rows)}
+
+
+class FakeSpreadsheet:
+    def __init__(self, backend: FakeSheetsBackend, headers: dict):
+        self.backend = backend
+        self.headers = headers
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        """Open `title`, creating it (with its configured header row) if missing."""
+        def open_worksheet():
+            header = self.headers.get(title)
+            self.backend.store.create(title, [list(header)] if header else [])
+            return FakeWorksheet(self.backend, title)
+        return self.backend.request("open_worksheet", open_worksheet)
+
+
+class FakeGSpreadClient:
+    """Stand-in for an authorized gspread client; every spreadsheet key shares one backend."""
+
+    def __init__(self, backend: FakeSheetsBackend = None, headers: dict = None):
+        self.backend = backend if backend is not None else FakeSheetsBackend()
+        self.headers = dict(headers or {})
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        return self.backend.request("open_by_key", lambda: FakeSpreadsheet(self.backend, self.headers))
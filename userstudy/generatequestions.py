@@ -1,54 +1,65 @@
+import argparse
+
 import pandas as pd
-import json
-from nltk.corpus import wordnet as wn
 from tqdm import tqdm
 
+import repo_root  # noqa: F401  (makes the shared root modules importable)
+from questionbank import QuestionBankWriter
+from glosses import GlossResolver
+
 # --- Config ---
 INPUT_CSV = "balanced_user_study_nodup_final_half.csv"
-OUTPUT_JSON = "/home/maja/HOI/streamlit/questions.json"
-
-# --- Load Sample ---
-df = pd.read_csv(INPUT_CSV)
-
-# --- Helper to get synset gloss ---
-def get_gloss(synset_name):
-    try:
-        return wn.synset(synset_name).definition()
-    except:
-        return "[Definition not found]"
-
-# --- Generate questions ---
-questions = []
-
-for i, row in tqdm(df.iterrows(), total=len(df)):
-    verb_gt = row["gt_verb"]
-    obj_gt = row["gt_object"]
-    verb_pred = row["pred_verb_synset"]
-    obj_pred = row["pred_object_synset"]
-
-    gt_verb_syn = row["gt_verb_synset"]
-    gt_obj_syn = row["gt_object_synset"]
-
-    question_text = (
-        f"Please compare the following labels:<br><br>"
-        f"<span style='font-weight:bold; color:#D6455C;'>  {verb_gt} {obj_gt} (ground truth) ↔ "
-        f"{verb_pred.split('.')[0]} {obj_pred.split('.')[0]} (prediction)</span><br><br>"
-        f"→ Definition {gt_obj_syn}: {get_gloss(gt_obj_syn)}<br>"
-        f"→ Definition {gt_verb_syn}: {get_gloss(gt_verb_syn)}<br>"
-        f"→ Definition {obj_pred}: {get_gloss(obj_pred)}<br>"
-        f"→ Definition {verb_pred}: {get_gloss(verb_pred)}<br><br>"
-        f"How similar is the prediction to the ground truth?<br>"
-        f"The prediction describes ..."
-    )
-
-    questions.append({
-        "id": i + 1,
-        "question": question_text,
-        "choices": ["0 = ... a completly dissimilar interaction", "1 = ... a somewhat related but clearly distinct interaction", "2 = ... a related interaction but it is easily distinguishable", "3 = ... a very similar interaction with subtle differences", "4 = ... an interaction that you would use interchangeably or synonymous with the ground truth"],
-    })
-
-# --- Save to JSON ---
-with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-    json.dump(questions, f, indent=2, ensure_ascii=False)
-
-print(f"✅ Saved {len(questions)} questions to {OUTPUT_JSON}")
+OUTPUT_JSON = "/home/maja/HOI/streamlit/questions.json"  # *.jsonl writes JSON Lines
+CHUNKSIZE = 10_000
+GLOSS_CACHE_FILE = ".gloss_cache.json"
+GLOSS_WORKERS = 0  # >1 resolves uncached synsets across a process pool
+
+SYNSET_COLUMNS = ["gt_object_synset", "gt_verb_synset", "pred_object_synset", "pred_verb_synset"]
+ROW_COLUMNS = ["gt_verb", "gt_object", "pred_verb_synset", "pred_object_synset",
+               "gt_verb_synset", "gt_object_synset"]
+
+CHOICES = ["0 = ... a completly dissimilar interaction", "1 = ... a somewhat related but clearly distinct interaction", "2 = ... a related interaction but it is easily distinguishable", "3 = ... a very similar interaction with subtle differences", "4 = ... an interaction that you would use interchangeably or synonymous with the ground truth"]
+
+
+# --- Generate questions, one CSV chunk at a time ---
+def generate_questions(input_csv: str, glosses: GlossResolver, chunksize: int = CHUNKSIZE):
+    """Yield {"id", "question", "choices"} dicts for the rows of `input_csv`."""
+    qid = 0
+    for chunk in pd.read_csv(input_csv, chunksize=chunksize):
+        # Every distinct synset gloss of the chunk is resolved once (cached on disk)
+        glosses.resolve(pd.unique(chunk[SYNSET_COLUMNS].to_numpy().ravel()))
+        get_gloss = glosses.gloss
+
+        for verb_gt, obj_gt, verb_pred, obj_pred, gt_verb_syn, gt_obj_syn in \
+                chunk[ROW_COLUMNS].itertuples(index=False, name=None):
+            qid += 1
+            question_text = (
+                f"Please compare the following labels:<br><br>"
+                f"<span style='font-weight:bold; color:#D6455C;'>  {verb_gt} {obj_gt} (ground truth) ↔ "
+                f"{verb_pred.split('.')[0]} {obj_pred.split('.')[0]} (prediction)</span><br><br>"
+                f"→ Definition {gt_obj_syn}: {get_gloss(gt_obj_syn)}<br>"
+                f"→ Definition {gt_verb_syn}: {get_gloss(gt_verb_syn)}<br>"
+                f"→ Definition {obj_pred}: {get_gloss(obj_pred)}<br>"
+                f"→ Definition {verb_pred}: {get_gloss(verb_pred)}<br><br>"
+                f"How similar is the prediction to the ground truth?<br>"
+                f"The prediction describes ..."
+            )
+            yield {"id": qid, "question": question_text, "choices": CHOICES}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the user-study question bank.")
+    parser.add_argument("--input", default=INPUT_CSV)
+    parser.add_argument("--output", default=OUTPUT_JSON, help="*.jsonl writes the JSON Lines format")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    args = parser.parse_args()
+
+    glosses = GlossResolver(GLOSS_CACHE_FILE, workers=GLOSS_WORKERS)
+
+    # --- Compile and save: sanitized HTML, shared choice sets, atomic rename at the end ---
+    with QuestionBankWriter(args.output) as writer:
+        for question in tqdm(generate_questions(args.input, glosses, args.chunksize)):
+            writer.add(question)
+
+    print(f"📖 Glosses: {len(glosses.glosses)} cached, {glosses.resolved} looked up in WordNet")
+    print(f"✅ Saved {writer.count} questions to {args.output}")
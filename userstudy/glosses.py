@@ -0,0 +1,79 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import repo_root  # noqa: F401  (makes the shared root modules importable)
+from fileio import atomic_write_json
+
+# WordNet gloss lookup with a persistent synset -> gloss cache.
+#
+# All synset names are deduplicated up front and only the ones missing from
+# the cache file are resolved through NLTK, once each, optionally across a
+# process pool. When the cache is warm NLTK is never imported, so the WordNet
+# corpus load is skipped entirely.
+
+GLOSS_CACHE_FILE = ".gloss_cache.json"
+NOT_FOUND = "[Definition not found]"
+
+
+def _lookup_glosses(names: list) -> dict:
+    """Resolve `names` through WordNet; unknown or malformed names map to None."""
+    from nltk.corpus import wordnet as wn
+    from nltk.corpus.reader.wordnet import WordNetError
+
+    glosses = {}
+    for name in names:
+        try:
+            glosses[name] = wn.synset(name).definition()
+        except (WordNetError, ValueError):
+            glosses[name] = None
+    return glosses
+
+
+class GlossResolver:
+    def __init__(self, cache_file: str = GLOSS_CACHE_FILE, workers: int = 0):
+        self.cache_file = cache_file
+        self.workers = workers
+        self.glosses = self._load()
+        self.resolved = 0
+
+    def _load(self) -> dict:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        with open(self.cache_file, "r", encoding="utf-8") as f:
+            return json.load(f).get("glosses", {})
+
+    def _save(self):
+        atomic_write_json(self.cache_file, {"format": "gloss-cache", "glosses": self.glosses},
+                          durable=False, ensure_ascii=False, sort_keys=True)
+
+    def resolve(self, synset_names) -> dict:
+        """Make sure every name in `synset_names` is cached; returns the missing ones resolved."""
+        missing = sorted({
+            name for name in synset_names
+            if isinstance(name, str) and name not in self.glosses
+        })
+        if not missing:
+            return {}
+
+        if self.workers > 1 and len(missing) > self.workers:
+            chunks = [missing[i::self.workers] for i in range(self.workers)]
+            found = {}
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for part in pool.map(_lookup_glosses, chunks):
+                    found.update(part)
+        else:
+            found = _lookup_glosses(missing)
+
+        self.glosses.update(found)
+        self.resolved += len(found)
+        if self.cache_file:
+            self._save()
+        return found
+
+    def gloss(self, synset_name) -> str:
+        if not isinstance(synset_name, str):
+            return NOT_FOUND
+        if synset_name not in self.glosses:
+            self.resolve([synset_name])
+        return self.glosses.get(synset_name) or NOT_FOUND
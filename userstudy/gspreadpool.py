@@ -0,0 +1,146 @@
+import json
+import random
+import threading
+import time
+
+import gspread
+from oauth2client.service_account import ServiceAccountCredentials
+
+# Process-wide gspread client and worksheet handles.
+#
+# Authorizing and opening a spreadsheet costs several HTTP round-trips, so
+# the pool does it once and then hands out cached worksheet handles keyed by
+# (spreadsheet_id, worksheet_name). Token refresh needs no help from the pool:
+# gspread converts the credentials to google-auth and refreshes the access
+# token itself when a request finds it expired. Only if the sheet rejects the
+# credentials outright (401, e.g. a rotated key) are the cached handles
+# dropped, so the next call authorizes again.
+
+SCOPE = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/drive"
+]
+
+
+class GSpreadPool:
+    def __init__(self, service_account_info: dict):
+        self._service_account_info = service_account_info
+        self._client = None
+        self._spreadsheets = {}
+        self._worksheets = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "client_hits": 0,
+            "client_misses": 0,
+            "worksheet_hits": 0,
+            "worksheet_misses": 0,
+            "invalidations": 0,
+        }
+
+    @classmethod
+    def from_secrets(cls, gspread_secrets) -> "GSpreadPool":
+        return cls(json.loads(gspread_secrets["gcp_service_account"]))
+
+    def _get_client(self):
+        if self._client is None:
+            self.stats["client_misses"] += 1
+            creds = ServiceAccountCredentials.from_json_keyfile_dict(
+                self._service_account_info, SCOPE
+            )
+            self._client = gspread.authorize(creds)
+            return self._client
+
+        self.stats["client_hits"] += 1
+        return self._client
+
+    def worksheet(self, spreadsheet_id: str, worksheet_name: str):
+        key = (spreadsheet_id, worksheet_name)
+        with self._lock:
+            client = self._get_client()
+            worksheet = self._worksheets.get(key)
+            if worksheet is not None:
+                self.stats["worksheet_hits"] += 1
+                return worksheet
+
+            self.stats["worksheet_misses"] += 1
+            spreadsheet = self._spreadsheets.get(spreadsheet_id)
+            if spreadsheet is None:
+                spreadsheet = client.open_by_key(spreadsheet_id)
+                self._spreadsheets[spreadsheet_id] = spreadsheet
+            worksheet = spreadsheet.worksheet(worksheet_name)
+            self._worksheets[key] = worksheet
+            return worksheet
+
+    def invalidate(self):
+        """Drop the client and every handle, e.g. after revoked credentials."""
+        with self._lock:
+            self._client = None
+            self._spreadsheets.clear()
+            self._worksheets.clear()
+            self.stats["invalidations"] += 1
+
+    def invalidate_on_auth_error(self, error: Exception) -> bool:
+        """invalidate() if `error` is the Sheets API rejecting the credentials."""
+        if _status_code(error) != AUTH_ERROR_STATUS:
+            return False
+        self.invalidate()
+        return True
+
+
+# --- Writes with retry ---
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+AUTH_ERROR_STATUS = 401
+
+
+def _status_code(error: Exception):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def with_backoff(fn, retries: int = 5, base_delay: float = 1.0, max_delay: float = 32.0, sleep=time.sleep):
+    """Call `fn`, retrying quota and server errors with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except gspread.exceptions.APIError as e:
+            if attempt == retries or _status_code(e) not in RETRYABLE_STATUS:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            sleep(delay + random.uniform(0, delay / 2))
+
+
+def page_rows_exist(worksheet, annotator_id: str, page: int) -> bool:
+    return any(
+        str(row["annotator_id"]) == annotator_id and str(row["page"]) == str(page)
+        for row in worksheet.get_all_records()
+    )
+
+
+def append_page_rows(worksheet, rows: list, annotator_id: str, page: int, **backoff) -> bool:
+    """Append all rows of one submitted page in a single request.
+
+    A single append is applied by the Sheets API as a whole, so a page is
+    never half written. The caller is expected to have checked already that
+    the page is not in the sheet (userstudy/app.py reuses the check from the
+    same rerun), so the first attempt appends right away. Only a retry after
+    a server error, whose append may have gone through anyway, first checks
+    the sheet for the page. Returns False if that check found it.
+
+    Avoiding duplicates is best-effort: the check and the append are separate
+    requests, so two concurrent submits of the same page can both append.
+    """
+    ambiguous = False
+
+    def attempt():
+        nonlocal ambiguous
+        if ambiguous and page_rows_exist(worksheet, annotator_id, page):
+            return False
+        try:
+            worksheet.append_rows(rows, value_input_option="RAW")
+        except gspread.exceptions.APIError as e:
+            # A 429 is rejected before anything is written; a 5xx may not be
+            ambiguous = ambiguous or (_status_code(e) or 0) >= 500
+            raise
+        return True
+
+    return with_backoff(attempt, **backoff)
@@ -1,70 +1,81 @@
+import numpy as np
 import pandas as pd
-from collections import defaultdict
+
+import repo_root  # noqa: F401  (makes the shared root modules importable)
+from fileio import AtomicFile
 
 # --- FILE PATHS ---
 GT_PATH = "sampled_hoi_gt_500.csv"
 OBJ_MAP_PATH = "hico_objects_with_synsets.csv"      # save your object mapping here
 VERB_MAP_PATH = "matched_verb_synsets_hico_annotated.csv"       # save your verb mapping here
 OUTPUT_PATH = "sampled_hoi_gt_500_with_synsets.csv"
+CHUNKSIZE = 1_000_000  # GT rows per chunk; full HICO-DET dumps never load at once
+
+
+# --- Build lookup tables ---
+def build_lookup(df: pd.DataFrame, key_col: str, synset_col: str) -> pd.DataFrame:
+    """One row per stripped key: its sorted-first synset and how many distinct synsets it has."""
+    table = pd.DataFrame({
+        "key": df[key_col].str.strip(),
+        "synset": df[synset_col].str.strip(),
+    }).dropna().drop_duplicates()
+    table = table.sort_values(["key", "synset"], kind="stable")
+    grouped = table.groupby("key", sort=False)["synset"]
+    return pd.DataFrame({"synset": grouped.first(), "n_synsets": grouped.size()})
+
+
+def attach_synsets(values: pd.Series, lookup: pd.DataFrame) -> tuple:
+    """Map `values` through `lookup`; returns (synsets, missing keys, multi-synset keys).
+
+    The join runs over the distinct values only, which are then broadcast back
+    to the rows by their factorized codes.
+    """
+    codes, uniques = pd.factorize(values)
+    keys = pd.Index(uniques).str.strip()
+    matched = lookup.reindex(keys)
+    synsets = matched["synset"].to_numpy(dtype=object)
+    # -1 marks a missing value in the GT itself, mapped to None like unknown keys
+    out = np.append(synsets, None)[codes]
+    out[pd.isna(out)] = None
+
+    missing = set(keys[matched["synset"].isna().to_numpy()])
+    multi = set(keys[(matched["n_synsets"] > 1).to_numpy()])
+    return out, missing, multi
+
+
+if __name__ == "__main__":
+    # --- Load Mappings ---
+    obj_df = pd.read_csv(OBJ_MAP_PATH)  # columns: Object, Synset
+    verb_df = pd.read_csv(VERB_MAP_PATH)  # columns: original_verb, lemmatized, synset
+
+    object_lookup = build_lookup(obj_df, "Object", "Synset")
+    verb_lookup = build_lookup(verb_df, "original_verb", "synset")
+
+    # --- Attach Synsets, one GT chunk at a time ---
+    missing_verb, missing_obj = set(), set()
+    multi_verb, multi_obj = set(), set()
+
+    # Chunks go to a temporary file that replaces OUTPUT_PATH once complete
+    rows = 0
+    with AtomicFile(OUTPUT_PATH, suffix=".csv") as output:
+        for i, gt_df in enumerate(pd.read_csv(GT_PATH, chunksize=CHUNKSIZE)):
+            verb_synsets, missing, multi = attach_synsets(gt_df["verb"], verb_lookup)
+            missing_verb |= missing
+            multi_verb |= multi
+
+            object_synsets, missing, multi = attach_synsets(gt_df["object"], object_lookup)
+            missing_obj |= missing
+            multi_obj |= multi
+
+            gt_df["verb_synset"] = verb_synsets
+            gt_df["object_synset"] = object_synsets
+            gt_df.to_csv(output, header=i == 0, index=False)
+            rows += len(gt_df)
+
+    # --- Report problems ---
+    print(f"✅ Extended {rows} GT rows with synsets. Saved to {OUTPUT_PATH}")
+    print(f"❌ Missing verb mappings: {sorted(missing_verb)}")
+    print(f"❌ Missing object mappings: {sorted(missing_obj)}")
+    print(f"⚠️ Multiple synsets for verbs: {sorted(multi_verb)}")
+    print(f"⚠️ Multiple synsets for objects: {sorted(multi_obj)}")
 
-# --- Load GT ---
-gt_df = pd.read_csv(GT_PATH)
-
-# --- Load Mappings ---
-obj_df = pd.read_csv(OBJ_MAP_PATH)  # columns: Object, Synset
-verb_df = pd.read_csv(VERB_MAP_PATH)  # columns: original_verb, lemmatized, synset
-
-# --- Build mapping dictionaries ---
-object_to_synset = defaultdict(set)
-for _, row in obj_df.iterrows():
-    object_to_synset[row["Object"].strip()].add(row["Synset"].strip())
-
-verb_to_synset = defaultdict(set)
-for _, row in verb_df.iterrows():
-    verb_to_synset[row["original_verb"].strip()].add(row["synset"].strip())
-
-# --- Attach Synsets ---
-verb_synsets = []
-object_synsets = []
-missing_verb, missing_obj = set(), set()
-multi_verb, multi_obj = set(), set()
-
-for _, row in gt_df.iterrows():
-    verb = row["verb"].strip()
-    obj = row["object"].strip()
-
-    vset = verb_to_synset.get(verb, set())
-    oset = object_to_synset.get(obj, set())
-
-    # Verb synset
-    if len(vset) == 0:
-        verb_synsets.append(None)
-        missing_verb.add(verb)
-    elif len(vset) > 1:
-        multi_verb.add(verb)
-        verb_synsets.append(sorted(vset)[0])  # pick consistent default
-    else:
-        verb_synsets.append(next(iter(vset)))
-
-    # Object synset
-    if len(oset) == 0:
-        object_synsets.append(None)
-        missing_obj.add(obj)
-    elif len(oset) > 1:
-        multi_obj.add(obj)
-        object_synsets.append(sorted(oset)[0])
-    else:
-        object_synsets.append(next(iter(oset)))
-
-gt_df["verb_synset"] = verb_synsets
-gt_df["object_synset"] = object_synsets
-
-# --- Report problems ---
-print(f"✅ Extended GT with synsets. Saving to {OUTPUT_PATH}")
-print(f"❌ Missing verb mappings: {sorted(missing_verb)}")
-print(f"❌ Missing object mappings: {sorted(missing_obj)}")
-print(f"⚠️ Multiple synsets for verbs: {sorted(multi_verb)}")
-print(f"⚠️ Multiple synsets for objects: {sorted(multi_obj)}")
-
-# --- Save ---
-gt_df.to_csv(OUTPUT_PATH, index=False)
@@ -1,117 +1,201 @@
+import numpy as np
 import pandas as pd
-import random
-from collections import defaultdict
+
+from simindex import load_similarity_index
 
 # --- Config ---
 INPUT_FILE = "balanced_user_study_sample_500_unique_gt.csv"
 VERB_SIM_FILE = "/home/maja/HOI/predictionsverb/merged_verb_scores_finalscore.csv"
 OBJ_SIM_FILE = "/home/maja/HOI/predictionsobject/merged_object_scores_finalscore.csv"
 OUTPUT_FILE = "balanced_user_study_nodup_final.csv"
-
-# --- Load ---
-df = pd.read_csv(INPUT_FILE)
-
-verb_sim_df = pd.read_csv(VERB_SIM_FILE)
-obj_sim_df = pd.read_csv(OBJ_SIM_FILE)
-
-# --- Create lookup for replacements ---
-def build_sim_lookup(df, label):
-    lookup = defaultdict(lambda: defaultdict(list))
-    for _, row in df.iterrows():
-        s1, s2 = row["synset_1"], row["synset_2"]
-        score = row["majority_score"]
-        if pd.notna(score):
-            sim = int(score)
-            lookup[s1][sim].append(s2)
-            lookup[s2][sim].append(s1)  # symmetric
-    return lookup
-
-verb_sim_lookup = build_sim_lookup(verb_sim_df, "verb")
-obj_sim_lookup = build_sim_lookup(obj_sim_df, "object")
-
-# --- Uniqueness check ---
-def row_signature(row):
-    return (
-        row["gt_verb"], row["gt_object"],
-        row["gt_verb_synset"], row["gt_object_synset"],
-        row["pred_verb_synset"], row["pred_object_synset"]
-    )
-
-seen = set()
-duplicates = []
-
-for idx, row in df.iterrows():
-    sig = row_signature(row)
-    if sig in seen:
-        duplicates.append(idx)
-    else:
-        seen.add(sig)
-
-print(f"🔍 Found {len(duplicates)} duplicates to replace")
-
-# --- Replace duplicates using external similarity source ---
-replaced = 0
-used_signatures = set(seen)  # to track new uniqueness
-
-for idx in duplicates:
-    row = df.loc[idx]
-    cat = row["category"]
-    level = row["similarity_level"]
-    gt_verb, gt_obj = row["gt_verb_synset"], row["gt_object_synset"]
-
-    new_row = None
-
-    if cat == 1:
-        # same verb, new object
-        candidates = obj_sim_lookup[gt_obj][level]
-        random.shuffle(candidates)
-        for obj_pred in candidates:
-            sig = row_signature({**row, "pred_object_synset": obj_pred})
-            if sig not in used_signatures:
-                new_row = row.copy()
-                new_row["pred_object_synset"] = obj_pred
-                used_signatures.add(sig)
-                break
-
-    elif cat == 2:
-        # same object, new verb
-        candidates = verb_sim_lookup[gt_verb][level]
-        random.shuffle(candidates)
-        for verb_pred in candidates:
-            sig = row_signature({**row, "pred_verb_synset": verb_pred})
-            if sig not in used_signatures:
-                new_row = row.copy()
-                new_row["pred_verb_synset"] = verb_pred
-                used_signatures.add(sig)
-                break
-
-    elif cat == 3:
-        # new verb and object
-        v_cands = verb_sim_lookup[gt_verb][level]
-        o_cands = obj_sim_lookup[gt_obj][level]
-        random.shuffle(v_cands)
-        random.shuffle(o_cands)
-
-        for v in v_cands:
-            for o in o_cands:
-                sig = row_signature({**row, "pred_verb_synset": v, "pred_object_synset": o})
+SEED = 0
+MAX_ATTEMPTS_PER_DUPLICATE = 10_000
+
+# A row's signature is these six values. The two predicted synsets come last
+# so a replacement only has to swap the low bits of a packed signature.
+SIGNATURE_COLUMNS = [
+    "gt_verb", "gt_object",
+    "gt_verb_synset", "gt_object_synset",
+    "pred_verb_synset", "pred_object_synset",
+]
+SIGNATURE_BITS = 24
+LOW_MASK = (1 << SIGNATURE_BITS) - 1
+
+
+# --- Interned signatures ---
+class SignatureCodes:
+    """Interns the signature columns into one shared vocabulary of int codes.
+
+    A signature packs the six codes into a single int: (prefix << 48) | (verb << 24) | obj,
+    where prefix packs the four gt columns. Each code must fit in its
+    SIGNATURE_BITS-bit field, otherwise distinct signatures would pack to the
+    same int and be merged as duplicates.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        values = df[SIGNATURE_COLUMNS].to_numpy(dtype=object)
+        codes, uniques = pd.factorize(values.ravel(), use_na_sentinel=False)
+        self.vocab = {value: i for i, value in enumerate(uniques.tolist())}
+        self._check_size()
+        self.codes = codes.reshape(values.shape).astype(np.int64)
+
+    def _check_size(self):
+        if len(self.vocab) > 1 << SIGNATURE_BITS:
+            raise OverflowError(
+                f"{len(self.vocab)} distinct signature values do not fit in {SIGNATURE_BITS}-bit codes"
+            )
+
+    def intern(self, value) -> int:
+        code = self.vocab.get(value)
+        if code is None:
+            code = self.vocab[value] = len(self.vocab)
+            self._check_size()
+        return code
+
+    def prefixes(self) -> list:
+        prefix = [0] * len(self.codes)
+        for col in range(4):
+            column = self.codes[:, col].tolist()
+            prefix = [(p << SIGNATURE_BITS) | c for p, c in zip(prefix, column)]
+        return prefix
+
+    @staticmethod
+    def pack(prefix: int, verb: int, obj: int) -> int:
+        return (((prefix << SIGNATURE_BITS) | verb) << SIGNATURE_BITS) | obj
+
+
+# --- Lazy candidate generation ---
+def sample_pairs(rng, n_v: int, n_o: int, limit: int):
+    """Yield up to `limit` distinct (v, o) index pairs, uniformly without replacement.
+
+    A sparse Fisher-Yates shuffle over the flattened n_v * n_o grid: only the
+    swapped positions are stored, so memory and time are O(pairs drawn), not
+    O(n_v * n_o).
+    """
+    total = n_v * n_o
+    swapped = {}
+    for i in range(min(total, limit)):
+        j = int(rng.integers(i, total))
+        pick = swapped.get(j, j)
+        swapped[j] = swapped.get(i, i)
+        yield divmod(pick, n_o)
+
+
+# --- Dedup ---
+def remove_duplicates(df: pd.DataFrame, verb_index, obj_index, seed: int = SEED,
+                      max_attempts: int = MAX_ATTEMPTS_PER_DUPLICATE, verbose: bool = True):
+    """Replace the predicted synsets of duplicate rows in place; returns (df, attempts).
+
+    Duplicates are found with one `duplicated()` over the signature columns.
+    Replacement candidates are checked against packed int signatures, and all
+    replacements are written back with a single `df.loc` assignment.
+    """
+    rng = np.random.default_rng(seed)
+    sig_codes = SignatureCodes(df)
+    prefixes = sig_codes.prefixes()
+    verb_codes = sig_codes.codes[:, 4].tolist()
+    obj_codes = sig_codes.codes[:, 5].tolist()
+
+    dup_mask = df.duplicated(subset=SIGNATURE_COLUMNS).to_numpy()
+    positions = np.flatnonzero(dup_mask).tolist()
+    if verbose:
+        print(f"🔍 Found {len(positions)} duplicates to replace")
+
+    used_signatures = {
+        SignatureCodes.pack(prefixes[i], verb_codes[i], obj_codes[i])
+        for i in np.flatnonzero(~dup_mask).tolist()
+    }
+
+    categories = df["category"].tolist()
+    levels = df["similarity_level"].tolist()
+    gt_verbs = df["gt_verb_synset"].tolist()
+    gt_objs = df["gt_object_synset"].tolist()
+    pred_verbs = df["pred_verb_synset"].tolist()
+    pred_objs = df["pred_object_synset"].tolist()
+    intern = sig_codes.intern
+
+    write_rows, write_values = [], []
+    attempts = []
+
+    for pos in positions:
+        cat, level = categories[pos], levels[pos]
+        prefix = prefixes[pos]
+        found = None
+        tries = 0
+
+        if cat == 1:
+            # same verb, new object
+            verb_code = verb_codes[pos]
+            candidates = obj_index.neighbors(gt_objs[pos], level)
+            for j in rng.permutation(len(candidates))[:max_attempts]:
+                tries += 1
+                obj_pred = obj_index.name(candidates[j])
+                sig = SignatureCodes.pack(prefix, verb_code, intern(obj_pred))
                 if sig not in used_signatures:
-                    new_row = row.copy()
-                    new_row["pred_verb_synset"] = v
-                    new_row["pred_object_synset"] = o
                     used_signatures.add(sig)
+                    found = (pred_verbs[pos], obj_pred)
                     break
-            if new_row is not None:
-                break
 
-    if new_row is not None:
-        df.loc[idx] = new_row
-        replaced += 1
-    else:
-        print(f"⚠️ Could not find replacement for row {idx} in bin (cat={cat}, sim={level})")
+        elif cat == 2:
+            # same object, new verb
+            obj_code = obj_codes[pos]
+            candidates = verb_index.neighbors(gt_verbs[pos], level)
+            for j in rng.permutation(len(candidates))[:max_attempts]:
+                tries += 1
+                verb_pred = verb_index.name(candidates[j])
+                sig = SignatureCodes.pack(prefix, intern(verb_pred), obj_code)
+                if sig not in used_signatures:
+                    used_signatures.add(sig)
+                    found = (verb_pred, pred_objs[pos])
+                    break
 
-print(f"✅ Replaced {replaced}/{len(duplicates)} duplicates")
+        elif cat == 3:
+            # new verb and object: draw random (v, o) pairs instead of walking the grid
+            v_cands = verb_index.neighbors(gt_verbs[pos], level)
+            o_cands = obj_index.neighbors(gt_objs[pos], level)
+            for vj, oj in sample_pairs(rng, len(v_cands), len(o_cands), max_attempts):
+                tries += 1
+                v = verb_index.name(v_cands[vj])
+                o = obj_index.name(o_cands[oj])
+                sig = SignatureCodes.pack(prefix, intern(v), intern(o))
+                if sig not in used_signatures:
+                    used_signatures.add(sig)
+                    found = (v, o)
+                    break
 
-# --- Save ---
-df.to_csv(OUTPUT_FILE, index=False)
-print(f"📁 Final deduplicated file saved to: {OUTPUT_FILE}")
+        attempts.append(tries)
+        if found is not None:
+            write_rows.append(df.index[pos])
+            write_values.append(found)
+        elif verbose:
+            print(f"⚠️ Could not find replacement for row {df.index[pos]} in bin "
+                  f"(cat={cat}, sim={level}) after {tries} attempts")
+
+    if write_rows:
+        df.loc[write_rows, ["pred_verb_synset", "pred_object_synset"]] = write_values
+
+    if verbose:
+        print(f"✅ Replaced {len(write_rows)}/{len(positions)} duplicates")
+        if attempts:
+            capped = sum(1 for t in attempts if t >= max_attempts)
+            print(
+                f"🎲 Candidate attempts per duplicate: total {sum(attempts)}, "
+                f"mean {sum(attempts) / len(attempts):.1f}, max {max(attempts)}, "
+                f"hit the {max_attempts} cap: {capped}"
+            )
+    return df, attempts
+
+
+if __name__ == "__main__":
+    # --- Load ---
+    df = pd.read_csv(INPUT_FILE)
+
+    # --- Similarity indexes for replacements (cached on disk per source file hash) ---
+    verb_index = load_similarity_index(VERB_SIM_FILE)
+    obj_index = load_similarity_index(OBJ_SIM_FILE)
+
+    df, _ = remove_duplicates(df, verb_index, obj_index, seed=SEED)
+
+    # --- Save ---
+    df.to_csv(OUTPUT_FILE, index=False)
+    print(f"📁 Final deduplicated file saved to: {OUTPUT_FILE}")
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# progress.py, questionbank.py and perf.py live in the repository root, next to
+# the top-level app.py. Streamlit and `python script.py` only put the script's
+# own directory on sys.path, so the scripts in userstudy/ import this module
+# first to make the root importable as well:
+#
+#     import repo_root  # noqa: F401
+#     from questionbank import load_question_bank
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
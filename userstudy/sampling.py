@@ -0,0 +1,346 @@
+import argparse
+import itertools
+from collections import defaultdict, deque
+
+import numpy as np
+import pandas as pd
+
+# Balanced sampling of candidate rows into (category, similarity_level)-style
+# bins, keeping at most one row per uniqueness key.
+#
+# Shared by downsample.py (unique image_id) and samplecategories.py (unique
+# image_id + gt synsets). Rows are handled as integer positions and keys are
+# factorized, so "already used" is one boolean mask.
+#
+#   python sampling.py input.csv output.csv --key image_id \
+#       --bin category=1,2,3 --bin similarity_level=1,2,3,4 --target-total 500
+
+
+def read_candidates(path: str) -> pd.DataFrame:
+    """Read the whole candidate table.
+
+    Not streamed: the sampler shuffles across every row, and Step 3A may top
+    off from any bin, so no row can be dropped while reading.
+    """
+    return pd.read_csv(path)
+
+
+class BalancedSampler:
+    def __init__(self, df: pd.DataFrame, key_columns, bin_columns, target_bins,
+                 target_total: int, target_per_bin: int = None, seed: int = 0):
+        self.df = df
+        self.bin_columns = list(bin_columns)
+        self.target_bins = [tuple(b) for b in target_bins]
+        self.target_total = target_total
+        self.target_per_bin = target_per_bin or target_total // len(self.target_bins)
+        self.fallback_counts = defaultdict(int)
+
+        rng = np.random.default_rng(seed)
+        self.key_codes = df.groupby(list(key_columns), sort=False, dropna=False).ngroup().to_numpy()
+        n_keys = int(self.key_codes.max()) + 1 if len(df) else 0
+        bin_codes, bin_keys = pd.MultiIndex.from_arrays(
+            [df[col] for col in self.bin_columns]
+        ).factorize()
+        self.bin_codes = bin_codes
+        self.bin_keys = list(bin_keys)
+
+        # Group rows by bin (order of first appearance), shuffled within each bin
+        perm = rng.permutation(len(df))
+        self.order = perm[np.argsort(bin_codes[perm], kind="stable")]
+        bounds = np.searchsorted(bin_codes[self.order], np.arange(len(self.bin_keys) + 1))
+        self.bins = {
+            key: self.order[bounds[b]:bounds[b + 1]] for b, key in enumerate(self.bin_keys)
+        }
+        self.empty = np.empty(0, dtype=self.order.dtype)
+        self.used = np.zeros(n_keys, dtype=bool)
+
+    def bin_rows(self, key):
+        return self.bins.get(key, self.empty)
+
+    def bin_sizes(self) -> pd.Series:
+        return pd.Series({k: len(v) for k, v in self.bins.items()}, dtype=int)
+
+    # --- Helpers working on row positions ---
+    def first_unique_unused(self, rows, n):
+        """First `n` rows (in order) whose key is unused and not repeated."""
+        candidates = rows[~self.used[self.key_codes[rows]]]
+        _, first = np.unique(self.key_codes[candidates], return_index=True)
+        return candidates[np.sort(first)][:n]
+
+    def pick_unique(self, rows, n):
+        selected = self.first_unique_unused(rows, n)
+        self.used[self.key_codes[selected]] = True
+        return selected
+
+    def next_unused(self, rows, start, chunk=4096):
+        """Index of the first row at or after `start` with an unused key, or -1."""
+        while start < len(rows):
+            free = np.flatnonzero(~self.used[self.key_codes[rows[start:start + chunk]]])
+            if len(free):
+                return start + free[0]
+            start += chunk
+        return -1
+
+    # --- Greedy sampler ---
+    def greedy(self, top_off: bool = True, rebalance: bool = True) -> np.ndarray:
+        """Pass 1, fallback round robin, then optional Step 3A top-off and Step 3B balancing."""
+        final = []
+
+        # --- Pass 1: Try to sample target per bin ---
+        for key in self.target_bins:
+            final.extend(self.pick_unique(self.bin_rows(key), self.target_per_bin).tolist())
+
+        # --- Pass 2: Fill remaining from any bin, one row per bin per round ---
+        # Used keys never become free again here, so each bin keeps a cursor
+        # past the rows it has already skipped.
+        cursors = defaultdict(int)
+        while len(final) < self.target_total:
+            made_progress = False
+            for key in self.target_bins:
+                if len(final) >= self.target_total:
+                    break
+                rows = self.bin_rows(key)
+                i = self.next_unused(rows, cursors[key])
+                if i < 0:
+                    cursors[key] = len(rows)
+                    continue
+                final.append(int(rows[i]))
+                self.used[self.key_codes[rows[i]]] = True
+                cursors[key] = i + 1
+                self.fallback_counts[key] += 1
+                made_progress = True
+            if not made_progress:
+                print("⚠️  No new samples added in fallback pass — every bin is exhausted.")
+                break
+
+        if top_off:
+            final = self._top_off(final)
+        final = np.asarray(final, dtype=int)
+        if rebalance:
+            final = self._rebalance(final)
+        return final
+
+    def _top_off(self, final):
+        # --- Step 3A: Global top-off from underrepresented bins ---
+        if len(final) < self.target_total:
+            print(f"\n🔁 Step 3A: Sampling globally to reach {self.target_total}...")
+            current = np.bincount(self.bin_codes[np.asarray(final, dtype=int)], minlength=len(self.bin_keys))
+            needed = np.zeros(len(self.bin_keys), dtype=int)
+            for b, key in enumerate(self.bin_keys):
+                if key in self.target_bins:
+                    needed[b] = self.target_per_bin - current[b]
+
+            remaining = self.order[~self.used[self.key_codes[self.order]]]
+            remaining = remaining[np.argsort(-needed[self.bin_codes[remaining]], kind="stable")]
+            picked = self.pick_unique(remaining, self.target_total - len(final))
+            final = final + picked.tolist()
+            for b in self.bin_codes[picked]:
+                self.fallback_counts[self.bin_keys[b]] += 1
+        print(f"\n📈 Step 3A complete — collected {len(final)} rows (target: {self.target_total})")
+        return final
+
+    def _rebalance(self, final):
+        # --- Step 3B: Evening out bin distribution ---
+        # Replace surplus rows of overfull bins with unused rows from underfull
+        # bins, releasing the replaced row's key.
+        print("\n⚖️ Step 3B: Evening out overfull vs underfull bins...")
+        target = self.target_per_bin
+        bin_counts = pd.Series(
+            np.bincount(self.bin_codes[final], minlength=len(self.bin_keys)), index=self.bin_keys
+        )
+        bin_counts = bin_counts[[key for key in self.target_bins if key in self.bins]]
+        overfull_bins = bin_counts[bin_counts > target].sort_values(ascending=False)
+        underfull_bins = bin_counts[bin_counts < target].sort_values()
+
+        bin_to_positions = defaultdict(list)
+        for pos, b in enumerate(self.bin_codes[final]):
+            bin_to_positions[self.bin_keys[b]].append(pos)
+
+        swaps = 0
+        for under_bin in underfull_bins.index:
+            rows = self.bins[under_bin]
+            cursor = 0
+            for over_bin in overfull_bins.index:
+                while bin_counts[under_bin] < target and bin_counts[over_bin] > target:
+                    i = self.next_unused(rows, cursor)
+                    if i < 0:
+                        break
+                    cursor = i + 1
+                    pos = bin_to_positions[over_bin].pop()
+                    self.used[self.key_codes[final[pos]]] = False
+                    final[pos] = rows[i]
+                    self.used[self.key_codes[rows[i]]] = True
+                    bin_to_positions[under_bin].append(pos)
+                    bin_counts[under_bin] += 1
+                    bin_counts[over_bin] -= 1
+                    self.fallback_counts[under_bin] += 1
+                    swaps += 1
+                if bin_counts[under_bin] >= target:
+                    break
+
+        print(f"✅ Step 3B complete — {swaps} rows swapped to even bins.")
+        return final
+
+    # --- Optimal sampler ---
+    # "One row per unique key, at most target_per_bin rows per bin" is a
+    # bipartite b-matching between bins and keys, i.e. a max-flow problem
+    # source -> bin (capacity = bin target) -> key (capacity 1) -> sink.
+    # There are only a handful of bins, so an augmenting path is a BFS over
+    # bins: bin A can take a key that bin B holds if B can replace it, and so
+    # on, until some bin on the path takes a free key. When no bin has an
+    # augmenting path left, the flow is maximum, so every remaining shortfall
+    # is a real infeasibility.
+    def optimal(self) -> np.ndarray:
+        n_bins = len(self.target_bins)
+        cand_keys, cand_rows = [], []
+        for key in self.target_bins:
+            rows = self.bin_rows(key)
+            _, first = np.unique(self.key_codes[rows], return_index=True)
+            rows = rows[np.sort(first)]  # one row per key, in shuffled order
+            cand_rows.append(rows)
+            cand_keys.append(self.key_codes[rows])
+
+        owner = np.full(len(self.used), -1, dtype=np.int64)
+        counts = np.zeros(n_bins, dtype=np.int64)
+
+        def augment(start) -> bool:
+            parent = {start: None}
+            queue = deque([start])
+            while queue:
+                b = queue.popleft()
+                owners = owner[cand_keys[b]]
+                free = np.flatnonzero(owners == -1)
+                if len(free):
+                    # Shift keys back along the path, ending with the free key
+                    take = cand_keys[b][free[0]]
+                    while True:
+                        owner[take] = b
+                        if parent[b] is None:
+                            counts[b] += 1
+                            return True
+                        b, take = parent[b]
+                for other in np.unique(owners):
+                    if other != b and other not in parent:
+                        parent[int(other)] = (b, cand_keys[b][np.argmax(owners == other)])
+                        queue.append(int(other))
+            return False
+
+        # --- Phase 1: maximum flow with every bin capped at target_per_bin ---
+        for b in range(n_bins):
+            while counts[b] < self.target_per_bin and augment(b):
+                pass
+
+        # --- Phase 2: past the targets, one more row per bin per round until target_total ---
+        # Bins take turns, as in the greedy fallback pass. Augmenting paths
+        # never lower a bin's count, so Phase 1 stays intact.
+        while counts.sum() < self.target_total:
+            before = counts.sum()
+            for b in range(n_bins):
+                if counts.sum() >= self.target_total:
+                    break
+                if augment(b):
+                    self.fallback_counts[self.target_bins[b]] += 1
+            if counts.sum() == before:
+                break
+
+        # --- Per-bin feasibility report ---
+        print("\n🧩 Optimal assignment per bin (target / assigned / unique keys available):")
+        for b, key in enumerate(self.target_bins):
+            status = "✅" if counts[b] >= self.target_per_bin else "❌ infeasible"
+            print(f"  Bin {key}: {self.target_per_bin} / {counts[b]} / {len(cand_keys[b])}  {status}")
+        short = int(np.maximum(self.target_per_bin - counts, 0).sum())
+        if short:
+            print(f"⚠️ {short} rows short of the per-bin target in total — no assignment can do better.")
+
+        self.used[:] = owner >= 0
+        final = [rows[owner[keys] == b] for b, (keys, rows) in enumerate(zip(cand_keys, cand_rows))]
+        return np.concatenate(final) if final else self.empty
+
+    def sample(self, mode: str = "greedy", **greedy_options) -> pd.DataFrame:
+        if mode == "optimal":
+            final = self.optimal()
+        elif mode == "greedy":
+            final = self.greedy(**greedy_options)
+        else:
+            raise ValueError(f"Unknown sampler mode {mode!r}; expected 'greedy' or 'optimal'")
+        out_df = self.df.iloc[final].copy()
+        out_df["bin"] = list(zip(*(out_df[col] for col in self.bin_columns)))
+        return out_df
+
+
+def print_bin_sizes(sampler: BalancedSampler):
+    print("📉 Bin sizes (before uniqueness filtering):")
+    print(sampler.bin_sizes().sort_values())
+
+
+def _label(column: str) -> str:
+    return column.replace("_", " ").title()  # similarity_level -> Similarity Level
+
+
+def print_stats(out_df: pd.DataFrame, sampler: BalancedSampler):
+    for column in sampler.bin_columns:
+        print(f"\n📊 Final {_label(column)} Distribution:")
+        print(out_df[column].value_counts().sort_index())
+
+    labels = ", ".join(_label(column) for column in sampler.bin_columns)
+    print(f"\n📊 Final ({labels}) Bin Counts:")
+    print(out_df.groupby(sampler.bin_columns).size())
+
+    print("\n⚠️ Fallbacks Used (beyond target per bin):")
+    for k, v in sorted(sampler.fallback_counts.items()):
+        print(f"  Bin {k}: +{v}")
+
+    if len(out_df) < sampler.target_total:
+        print(f"\n⚠️ Only collected {len(out_df)} unique predictions — some bins were too sparse.")
+
+
+# --- Command line ---
+def _parse_value(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+def _parse_bin(spec: str):
+    column, _, values = spec.partition("=")
+    if not values:
+        raise argparse.ArgumentTypeError(f"expected COLUMN=V1,V2,... but got {spec!r}")
+    return column, [_parse_value(v) for v in values.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Balanced, key-unique sampling of candidate rows.")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--key", nargs="+", default=["image_id"], help="uniqueness key column(s)")
+    parser.add_argument("--bin", dest="bins", type=_parse_bin, action="append", required=True,
+                        help="bin column and its target values, e.g. category=1,2,3 (repeatable)")
+    parser.add_argument("--target-total", type=int, default=500)
+    parser.add_argument("--target-per-bin", type=int, default=None)
+    parser.add_argument("--mode", choices=["greedy", "optimal"], default="greedy")
+    parser.add_argument("--no-top-off", action="store_true", help="skip the Step 3A global top-off")
+    parser.add_argument("--no-rebalance", action="store_true", help="skip the Step 3B bin balancing")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    bin_columns = [column for column, _ in args.bins]
+    target_bins = list(itertools.product(*(values for _, values in args.bins)))
+
+    df = read_candidates(args.input)
+    sampler = BalancedSampler(
+        df, args.key, bin_columns, target_bins, args.target_total,
+        target_per_bin=args.target_per_bin, seed=args.seed,
+    )
+    print_bin_sizes(sampler)
+    greedy_options = {}
+    if args.mode == "greedy":
+        greedy_options = {"top_off": not args.no_top_off, "rebalance": not args.no_rebalance}
+    out_df = sampler.sample(args.mode, **greedy_options)
+    out_df.to_csv(args.output, index=False)
+    print(f"\n✅ Saved balanced sample file to {args.output} with {len(out_df)} rows")
+    print_stats(out_df, sampler)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import atexit
+import re
+import threading
+from datetime import datetime
+
+# Write-behind queue for the live answer log in the shared "sheet1" worksheet.
+#
+# Radio changes only record the answer in memory. A background thread flushes
+# the pending answers every `flush_interval` seconds (or as soon as
+# `max_pending` distinct answers are waiting). Repeated changes to the same
+# (annotator, page, question) before a flush are coalesced into one row.
+#
+# A flush sends only the batch: one append_rows for keys new to the sheet and
+# one batch_update for keys already there, so its cost does not grow with the
+# number of answers in sheet1. The sheet is read in full only the first time
+# and again after a failed flush, to rebuild the key -> row number map.
+
+LIVE_COLUMNS = ["timestamp", "annotator_id", "page", "question_id", "answer"]
+KEY_COLUMNS = ["annotator_id", "page", "question_id"]
+
+
+def _row_key(annotator_id, page, qid) -> tuple:
+    # Sheets hands numbers back as "3", 3 or 3.0 depending on how they were read
+    try:
+        page = int(float(page))
+    except (TypeError, ValueError):
+        pass
+    return str(annotator_id), str(page), str(qid)
+
+
+def _column_letter(n: int) -> str:
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def _first_appended_row(response):
+    # append_rows returns {"updates": {"updatedRange": "sheet1!A12:E14", ...}}
+    try:
+        updated_range = response["updates"]["updatedRange"]
+    except (KeyError, TypeError):
+        return None
+    match = re.search(r"!\$?[A-Z]+\$?(\d+)", updated_range)
+    return int(match.group(1)) if match else None
+
+
+class LiveSheetBackend:
+    """Applies a batch of answers to a gspread worksheet with at most two requests.
+
+    The key -> row number map assumes this process is the only writer of the
+    worksheet (as the single app3 process is). It is dropped after any failed
+    flush, so the retry re-reads the sheet and does not append a row twice
+    when an ambiguous failure had in fact gone through.
+    """
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.reads = 0
+        self._header = None
+        self._row_of = None
+        self._next_row = 0
+
+    def _load(self):
+        values = self.worksheet.get_all_values()
+        self.reads += 1
+        self._header = list(values[0]) if values else list(LIVE_COLUMNS)
+        self._row_of = {}
+        self._next_row = len(values) + 1 if values else 1
+        if not values:
+            return
+        key_cols = [self._header.index(col) for col in KEY_COLUMNS]
+        for number, row in enumerate(values[1:], start=2):
+            cells = [row[i] if i < len(row) else "" for i in key_cols]
+            self._row_of[_row_key(*cells)] = number  # later rows win
+
+    def upsert(self, rows: list):
+        try:
+            self._upsert(rows)
+        except Exception:
+            self._row_of = None
+            raise
+
+    def _upsert(self, rows: list):
+        if self._row_of is None:
+            self._load()
+        last_col = _column_letter(len(self._header))
+        updates, appends = [], {}
+        for row in rows:
+            key = _row_key(row["annotator_id"], row["page"], row["question_id"])
+            values = [row.get(col, "") for col in self._header]
+            number = self._row_of.get(key)
+            if number is None:
+                appends[key] = values
+            else:
+                updates.append({"range": f"A{number}:{last_col}{number}", "values": [values]})
+
+        if updates:
+            self.worksheet.batch_update(updates, value_input_option="RAW")
+        if appends:
+            body = list(appends.values())
+            header_rows = 0
+            if self._next_row == 1:  # empty sheet: write the header first
+                body.insert(0, list(self._header))
+                header_rows = 1
+            response = self.worksheet.append_rows(body, value_input_option="RAW")
+            first = _first_appended_row(response) or self._next_row
+            for offset, key in enumerate(appends, start=first + header_rows):
+                self._row_of[key] = offset
+            self._next_row = first + len(body)
+
+
+class WriteBehindQueue:
+    def __init__(self, backend, flush_interval: float = 5.0, max_pending: int = 50):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.last_error = None
+        self.stats = {"events": 0, "coalesced": 0, "flushes": 0, "rows_written": 0, "errors": 0}
+
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="sheet-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, annotator_id: str, page: int, qid: str, answer: str):
+        key = (annotator_id, int(page), str(qid))
+        row = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "annotator_id": annotator_id,
+            "page": int(page),
+            "question_id": str(qid),
+            "answer": answer,
+        }
+        with self._cond:
+            self.stats["events"] += 1
+            if key in self._pending:
+                self.stats["coalesced"] += 1
+            self._pending[key] = row
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self):
+        """Write everything queued so far; safe to call from any thread."""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                self.backend.upsert(list(batch.values()))
+            except Exception as e:
+                # Put the rows back unless a newer answer arrived meanwhile
+                with self._cond:
+                    for key, row in batch.items():
+                        self._pending.setdefault(key, row)
+                    self.stats["errors"] += 1
+                self.last_error = e
+                return
+            self.last_error = None
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.max_pending:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+            if self.last_error is not None:
+                # Back off before retrying a failed batch
+                with self._cond:
+                    if not self._closed:
+                        self._cond.wait(self.flush_interval)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=30)
+        self.flush()
@@ -0,0 +1,76 @@
+import time
+
+import pandas as pd
+
+# Per-session snapshot of one annotator's worksheet.
+#
+# The worksheet is read once and kept in st.session_state. The response map
+# and the set of submitted pages are derived from it with vectorized pandas
+# operations. Our own writes are applied to the local copy. The TTL (for
+# edits made directly in the sheet) triggers another read, and so does every
+# write, which must start from the sheet as it is now.
+
+SUBMISSION_COLUMNS = ["timestamp", "annotator_id", "page", "question_id", "answer"]
+
+
+class AnnotatorSheetSnapshot:
+    def __init__(self, conn, annotator_id: str, ttl: float = 300):
+        self.conn = conn
+        self.annotator_id = annotator_id
+        self.ttl = ttl
+        self.reads = 0
+        self._df = None
+        self._loaded_at = 0.0
+        self.responses = {}
+        self.submitted_pages = frozenset()
+
+    def _is_stale(self) -> bool:
+        return self._df is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def refresh(self):
+        df = self.conn.read(worksheet=self.annotator_id, ttl=0)
+        self.reads += 1
+        self._set(df if df is not None else pd.DataFrame(columns=SUBMISSION_COLUMNS))
+        self._loaded_at = time.monotonic()
+
+    def _set(self, df: pd.DataFrame):
+        self._df = df.reset_index(drop=True)
+        if df.empty:
+            self.responses = {}
+            self.submitted_pages = frozenset()
+            return
+
+        # Later rows win, as with the row-by-row load this replaces
+        self.responses = dict(zip(df["question_id"].astype(str), df["answer"]))
+        # Pages are only ever written whole, so any row of a page means it was
+        # submitted (the last page can be shorter than a full page)
+        pages = pd.to_numeric(df["page"], errors="coerce").dropna().astype(int)
+        self.submitted_pages = frozenset(pages.unique().tolist())
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._is_stale():
+            self.refresh()
+        return self._df
+
+    def ensure_fresh(self):
+        if self._is_stale():
+            self.refresh()
+
+    def is_page_submitted(self, page: int) -> bool:
+        self.ensure_fresh()
+        return int(page) in self.submitted_pages
+
+    def record_rows(self, new_rows: list):
+        """Apply rows we just wrote to the sheet to the local copy."""
+        self._set(pd.concat([self.df, pd.DataFrame(new_rows)], ignore_index=True))
+
+
+def get_sheet_snapshot(session_state, conn, annotator_id: str, ttl: float = 300) -> AnnotatorSheetSnapshot:
+    key = f"sheet_snapshot_{annotator_id}"
+    snapshot = session_state.get(key)
+    if snapshot is None:
+        snapshot = AnnotatorSheetSnapshot(conn, annotator_id, ttl)
+        session_state[key] = snapshot
+    snapshot.ensure_fresh()
+    return snapshot
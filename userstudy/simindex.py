@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import repo_root  # noqa: F401  (makes the shared root modules importable)
+from fileio import file_digest
+
+# Persistent synset-similarity index built from the merged *_finalscore.csv
+# files (columns synset_1, synset_2, majority_score).
+#
+# Synsets are interned to integer ids. Neighbours are stored CSR-style: the
+# neighbour ids of (synset, level) are
+#     indices[indptr[sid * n_levels + level - min_level] : indptr[... + 1]]
+# Each pair is stored in both directions, in CSV row order, as the dict of
+# lists it replaces did. The arrays are cached as .npy files in a directory
+# named after the source file's hash and are memory-mapped on load, so later
+# runs skip the CSV entirely.
+
+CACHE_DIR = ".simindex_cache"
+
+
+class SimilarityIndex:
+    def __init__(self, names, indptr, indices, min_level: int, n_levels: int):
+        self.names = names
+        self.indptr = indptr
+        self.indices = indices
+        self.min_level = min_level
+        self.n_levels = n_levels
+        self._ids = None
+
+    @property
+    def ids(self) -> dict:
+        if self._ids is None:
+            self._ids = {name: i for i, name in enumerate(self.names.tolist())}
+        return self._ids
+
+    def id_of(self, synset: str) -> int:
+        return self.ids.get(synset, -1)
+
+    def neighbors(self, synset, level: int) -> np.ndarray:
+        """Neighbour ids of `synset` (name or id) at `level`, as a view."""
+        sid = self.id_of(synset) if isinstance(synset, str) else int(synset)
+        slot = int(level) - self.min_level
+        if sid < 0 or not 0 <= slot < self.n_levels:
+            return self.indices[:0]
+        pos = sid * self.n_levels + slot
+        return self.indices[self.indptr[pos]:self.indptr[pos + 1]]
+
+    def name(self, sid: int) -> str:
+        return str(self.names[sid])
+
+
+def build_similarity_index(csv_path: str) -> SimilarityIndex:
+    df = pd.read_csv(csv_path, usecols=["synset_1", "synset_2", "majority_score"])
+    df = df[df["majority_score"].notna()]
+    levels = df["majority_score"].astype(int).to_numpy()
+
+    # Interleave both directions per row: (s1 -> s2), (s2 -> s1), ...
+    pairs = np.column_stack([df["synset_1"].to_numpy(), df["synset_2"].to_numpy()])
+    codes, names = pd.factorize(pairs.ravel())
+    codes = codes.reshape(-1, 2)
+    src = codes.ravel()
+    dst = codes[:, ::-1].ravel()
+    lvl = np.repeat(levels, 2)
+
+    min_level = int(lvl.min()) if len(lvl) else 0
+    n_levels = int(lvl.max()) - min_level + 1 if len(lvl) else 1
+    slots = src.astype(np.int64) * n_levels + (lvl - min_level)
+    order = np.argsort(slots, kind="stable")
+    indices = dst[order].astype(np.int32)
+    counts = np.bincount(slots, minlength=len(names) * n_levels)
+    indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return SimilarityIndex(np.asarray(names, dtype=str), indptr, indices, min_level, n_levels)
+
+
+def load_similarity_index(csv_path: str, cache_dir: str = CACHE_DIR) -> SimilarityIndex:
+    """Load the cached index for `csv_path`, building it if the file changed."""
+    digest = file_digest(csv_path)
+    base = os.path.splitext(os.path.basename(csv_path))[0]
+    target = os.path.join(cache_dir, f"{base}-{digest[:16]}")
+
+    meta_path = os.path.join(target, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return SimilarityIndex(
+            np.load(os.path.join(target, "names.npy"), mmap_mode="r"),
+            np.load(os.path.join(target, "indptr.npy"), mmap_mode="r"),
+            np.load(os.path.join(target, "indices.npy"), mmap_mode="r"),
+            meta["min_level"],
+            meta["n_levels"],
+        )
+
+    index = build_similarity_index(csv_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-")
+    try:
+        np.save(os.path.join(tmp, "names.npy"), index.names)
+        np.save(os.path.join(tmp, "indptr.npy"), index.indptr)
+        np.save(os.path.join(tmp, "indices.npy"), index.indices)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"source": csv_path, "sha1": digest, "min_level": index.min_level,
+                       "n_levels": index.n_levels}, f, indent=2)
+        os.replace(tmp, target)
+    except OSError:
+        # Another run may have written the same cache concurrently
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.exists(meta_path):
+            raise
+    return index
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sampling import BalancedSampler, read_candidates
+
+# Tests for the balanced sampler on a tiny synthetic candidate file.
+#
+#   python -m pytest userstudy/test_sampling.py
+
+CATEGORIES = [1, 2]
+SIM_LEVELS = [1, 2]
+TARGET_BINS = [(cat, sim) for cat in CATEGORIES for sim in SIM_LEVELS]
+BIN_COLUMNS = ["category", "similarity_level"]
+
+
+@pytest.fixture
+def candidates_csv(tmp_path):
+    # 150 rows over 45 image_ids; similarity level 2 is sparse, so the
+    # fallback pass and the uniqueness constraint both come into play
+    rng = np.random.default_rng(7)
+    n_rows = 150
+    df = pd.DataFrame({
+        "image_id": rng.integers(0, 45, n_rows),
+        "gt_verb_synset": rng.choice(["ride.v.01", "hold.v.01", "eat.v.01"], n_rows),
+        "category": rng.choice(CATEGORIES, n_rows),
+        "similarity_level": rng.choice(SIM_LEVELS, n_rows, p=[0.85, 0.15]),
+    })
+    path = tmp_path / "candidates.csv"
+    df.to_csv(path, index=False)
+    return path
+
+
+def make_sampler(path, key_columns=("image_id",), target_total=40, seed=0) -> BalancedSampler:
+    return BalancedSampler(
+        read_candidates(path), list(key_columns), BIN_COLUMNS, TARGET_BINS, target_total, seed=seed
+    )
+
+
+def reference_pass1_fallback(sampler: BalancedSampler) -> list:
+    """The original row-by-row Pass 1 + fallback loop, run over the sampler's shuffled bins."""
+    final, used = [], set()
+    for key in TARGET_BINS:
+        picked = 0
+        for row in sampler.bin_rows(key):
+            if picked == sampler.target_per_bin:
+                break
+            if sampler.key_codes[row] not in used:
+                final.append(int(row))
+                used.add(sampler.key_codes[row])
+                picked += 1
+
+    while len(final) < sampler.target_total:
+        made_progress = False
+        for key in TARGET_BINS:
+            if len(final) >= sampler.target_total:
+                break
+            for row in sampler.bin_rows(key):
+                if sampler.key_codes[row] not in used:
+                    final.append(int(row))
+                    used.add(sampler.key_codes[row])
+                    made_progress = True
+                    break
+        if not made_progress:
+            break
+    return final
+
+
+def bin_counts(out_df: pd.DataFrame) -> dict:
+    return out_df.groupby(BIN_COLUMNS).size().to_dict()
+
+
+@pytest.mark.parametrize("mode", ["greedy", "optimal"])
+@pytest.mark.parametrize("key_columns", [("image_id",), ("image_id", "gt_verb_synset")])
+def test_keys_are_unique(candidates_csv, mode, key_columns):
+    out_df = make_sampler(candidates_csv, key_columns).sample(mode)
+    assert not out_df.duplicated(list(key_columns)).any()
+
+
+@pytest.mark.parametrize("mode", ["greedy", "optimal"])
+def test_bins_stay_within_target_plus_fallbacks(candidates_csv, mode):
+    sampler = make_sampler(candidates_csv)
+    out_df = sampler.sample(mode)
+    for key, count in bin_counts(out_df).items():
+        assert count <= sampler.target_per_bin + sampler.fallback_counts[key]
+
+
+def test_bins_capped_when_every_bin_is_feasible(candidates_csv):
+    # Targets of 3 per bin are reachable everywhere, so no bin needs a fallback
+    sampler = make_sampler(candidates_csv, target_total=3 * len(TARGET_BINS))
+    out_df = sampler.sample("greedy")
+    assert bin_counts(out_df) == {key: 3 for key in TARGET_BINS}
+    assert not any(sampler.fallback_counts.values())
+
+
+@pytest.mark.parametrize("mode", ["greedy", "optimal"])
+def test_fixed_seed_is_reproducible(candidates_csv, mode):
+    first = make_sampler(candidates_csv, seed=3).sample(mode)
+    second = make_sampler(candidates_csv, seed=3).sample(mode)
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_greedy_matches_original_pass1_and_fallback(candidates_csv):
+    expected = reference_pass1_fallback(make_sampler(candidates_csv))
+    sampler = make_sampler(candidates_csv)
+    assert sampler.greedy(top_off=False, rebalance=False).tolist() == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_optimal_does_at_least_as_well_as_greedy(candidates_csv, seed):
+    greedy_sampler = make_sampler(candidates_csv, seed=seed)
+    greedy = greedy_sampler.sample("greedy", top_off=False, rebalance=False)
+    optimal_sampler = make_sampler(candidates_csv, seed=seed)
+    optimal = optimal_sampler.sample("optimal")
+
+    assert len(optimal) >= len(greedy)
+
+    def within_target(out_df, target):
+        return sum(min(count, target) for count in bin_counts(out_df).values())
+
+    target = optimal_sampler.target_per_bin
+    assert within_target(optimal, target) >= within_target(greedy, target)